@@ -21,8 +21,6 @@ from openai import OpenAI
 from sqlalchemy import func, inspect, text
 from sqlalchemy.orm import subqueryload
 from sqlalchemy.exc import IntegrityError
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 
 from flask import (
     Flask,
@@ -50,7 +48,10 @@ from google.auth.transport import requests as google_requests
 
 from assistant_bp import assistant_bp
 from streak_bp import streak_bp, start_streak_scheduler, recalculate_streak # <-- Добавлено
-from gemini_visualizer import create_record, generate_for_user, _compute_pct
+from gemini_visualizer import (begin_record, create_record, fail_record, generate_for_user, submit_generation,
+                               warm_cache as warm_visualization_cache,
+                               prune_cache as prune_visualization_cache, _compute_pct, _PENDING_TTL)
+from storage import put_file as put_stored_file, read_file as read_stored_file
 from meal_reminders import (
     get_scheduler,
     pause_job,
@@ -62,7 +63,7 @@ from shopping_bp import shopping_bp
 from user_bp import user_bp
 # Добавляем этот импорт, чтобы отправка работала в админке
 from notification_service import send_user_notification
-from models import BodyVisualization, SubscriptionApplication, EmailVerification, SquadScoreLog, SupportTicket, SupportMessage
+from models import BodyVisualization, VisualizationCache, SubscriptionApplication, EmailVerification, SquadScoreLog, SupportTicket, SupportMessage
 from flask import send_file
 from io import BytesIO
 from progress_analyzer import generate_progress_commentary
@@ -106,25 +107,18 @@ if SENTRY_DSN:
 
 app = Flask(__name__)
 
-# Настройка лимитов (теперь через Redis для работы с Gunicorn)
-redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-
-limiter = Limiter(
-    get_remote_address,
-    app=app,
-    default_limits=["5000 per day", "500 per hour"],
-    storage_uri=redis_url
-)
-
 app.secret_key = os.getenv("SECRET_KEY", "supersecret")
 app.jinja_env.globals.update(getattr=getattr)
 # Config DB — задаём ДО init_app
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-from extensions import db
+from extensions import db, limiter
 db.init_app(app)
 
+# Настройка лимитов (теперь через Redis для работы с Gunicorn), сам Limiter — в extensions.py
+limiter.init_app(app)
+
 from models import (
     User, Subscription, Order, Group, GroupMember, GroupMessage, MessageReaction,
     GroupTask, MealLog, Activity, Diet, Training, TrainingSignup, BodyAnalysis,
@@ -792,8 +786,8 @@ def _notification_worker():
                         func.sum(SquadScoreLog.points).label('total')
                     ).filter(
                         SquadScoreLog.group_id == group.id,
-                        func.date(SquadScoreLog.created_at) >= start_of_last_week,
-                        func.date(SquadScoreLog.created_at) <= end_of_last_week
+                        SquadScoreLog.created_at >= _day_start(start_of_last_week),
+                        SquadScoreLog.created_at < _day_start(end_of_last_week + timedelta(days=1))
                     ).group_by(SquadScoreLog.user_id).order_by(text('total DESC')).all()
 
                     for rank, (uid, score) in enumerate(scores[:3]):
@@ -889,6 +883,12 @@ def start_training_notifier():
         # Файл уже заблокирован другим воркером. Молча пропускаем запуск.
         pass
 
+def _day_start(d):
+    """Начало суток d как datetime: фильтры по created_at остаются диапазонами и используют индекс,
+    в отличие от func.date(created_at), который индекс по колонке не задействует."""
+    return datetime.combine(d, dt_time.min)
+
+
 def _ensure_column(table, column, ddl):
     # инспектору передаём «сырое» имя (без кавычек), он сам разберётся
     insp = inspect(db.engine)
@@ -898,10 +898,66 @@ def _ensure_column(table, column, ddl):
         preparer = db.engine.dialect.identifier_preparer
         table_q = preparer.quote(table)     # например -> "user"
         column_q = preparer.quote(column)   # например -> "sex"
-        with db.engine.connect() as con:
+        with db.engine.begin() as con:
             con.execute(text(f'ALTER TABLE {table_q} ADD COLUMN {column_q} {ddl}'))
 
+
+def _ensure_index(name, table, columns, unique=False):
+    preparer = db.engine.dialect.identifier_preparer
+    cols_q = ", ".join(preparer.quote(c) for c in columns)
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    with db.engine.begin() as con:
+        con.execute(text(f'CREATE {kind} IF NOT EXISTS {preparer.quote(name)} '
+                         f'ON {preparer.quote(table)} ({cols_q})'))
+
+
+def _ensure_fk_cascade(table, column, ref_table='user'):
+    """Пересоздаёт FK на ref_table с ON DELETE CASCADE (только Postgres: SQLite не умеет менять constraint)."""
+    if db.engine.dialect.name != 'postgresql':
+        return
+    preparer = db.engine.dialect.identifier_preparer
+    for fk in inspect(db.engine).get_foreign_keys(table):
+        if fk['constrained_columns'] != [column] or fk['referred_table'] != ref_table:
+            continue
+        if (fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE':
+            continue
+        name_q = preparer.quote(fk['name'])
+        with db.engine.begin() as con:
+            con.execute(text(f'ALTER TABLE {preparer.quote(table)} DROP CONSTRAINT {name_q}, '
+                             f'ADD CONSTRAINT {name_q} FOREIGN KEY ({preparer.quote(column)}) '
+                             f'REFERENCES {preparer.quote(ref_table)} (id) ON DELETE CASCADE'))
+
+
+def _ensure_schema():
+    """Доводит схему до моделей там, где create_all не поможет (новые колонки в старых таблицах)."""
+    _ensure_column('uploaded_files', 'storage_url', 'VARCHAR(500)')
+    _ensure_column('body_visualization', 'idempotency_key', 'VARCHAR(64)')
+    _ensure_index('uq_body_visualization_idempotency', 'body_visualization',
+                  ['user_id', 'idempotency_key'], unique=True)
+    _ensure_column('body_visualization', 'avatar_hash', 'VARCHAR(64)')
+    VisualizationCache.__table__.create(db.engine, checkfirst=True)
+    _ensure_index('ix_activity_user_date_steps', 'activity', ['user_id', 'date', 'steps'])
+    _ensure_index('ix_body_analysis_user_timestamp', 'body_analysis', ['user_id', 'timestamp'])
+    _ensure_index('ix_notifications_user_id', 'notifications', ['user_id', 'id'])
+    # Персональные данные удаляются вместе с юзером самой БД (см. delete_my_account)
+    for table in ('meal_logs', 'activity', 'diet', 'body_analysis', 'weight_logs', 'squad_score_logs',
+                  'meal_reminder_log', 'notifications', 'user_settings', 'diet_preference',
+                  'subscription', 'body_visualization'):
+        _ensure_fk_cascade(table, 'user_id')
+
+
 with app.app_context():
+    try:
+        _ensure_schema()
+    except Exception as e:
+        print(f"[schema] ensure failed: {e}")
+
+    try:
+        print(f"[viz] shared cache pruned: {prune_visualization_cache()} records")
+        print(f"[viz] cache warmed: {warm_visualization_cache()} records")
+    except Exception as e:
+        db.session.rollback()
+        print(f"[viz] cache warmup failed: {e}")
 
     import os as _os
 
@@ -1469,7 +1525,7 @@ def app_profile_data():
                 func.sum(SquadScoreLog.points).label('total')
             ).filter(
                 SquadScoreLog.group_id == group_id,
-                func.date(SquadScoreLog.created_at) >= start_of_week
+                SquadScoreLog.created_at >= _day_start(start_of_week)
             ).group_by(SquadScoreLog.user_id).order_by(text('total DESC')).all()
 
             squad_rank = len(scores) + 1
@@ -2428,7 +2484,7 @@ def api_me():
                 func.sum(SquadScoreLog.points).label('total')
             ).filter(
                 SquadScoreLog.group_id == group_id,
-                func.date(SquadScoreLog.created_at) >= start_of_week
+                SquadScoreLog.created_at >= _day_start(start_of_week)
             ).group_by(SquadScoreLog.user_id).order_by(text('total DESC')).all()
 
             # Ищем себя в списке
@@ -2810,20 +2866,42 @@ def onboarding_generate_visualization():
     Генерирует визуализацию на основе трех показателей (рост, вес, жир) и фото в рост.
     """
     user = get_current_user()
+    viz_record = None
     try:
         metrics_current = json.loads(request.form.get('metrics'))
         file = request.files.get('full_body_photo')
         full_body_photo_bytes = file.read()
 
+        # Рассчитываем целевую "Точку Б"
+        metrics_current["sex"] = user.sex
+        metrics_target = _calculate_target_metrics(user, metrics_current)
+
+        # Повтор того же запроса (ключ — хэш фото и метрик) не создаёт второй анализ,
+        # не запускает вторую генерацию и не сохраняет фото ещё раз
+        viz_record, should_generate = begin_record(user, full_body_photo_bytes, metrics_current, metrics_target)
+        if not should_generate:
+            if viz_record.status == "pending":
+                return _visualization_pending(viz_record)
+            return jsonify({
+                "success": True,
+                "before_photo_url": url_for('serve_file', filename=viz_record.image_current_path),
+                "after_photo_url": url_for('serve_file', filename=viz_record.image_target_path),
+            })
+
         # --- ИЗМЕНЕНИЕ: Сохраняем фото в полный рост в профиль пользователя ---
         if file and full_body_photo_bytes:
             filename = secure_filename(file.filename) or "body_photo.jpg"
             unique_filename = f"body_{user.id}_{uuid.uuid4().hex}.jpg"
 
+            content_type = file.mimetype or 'image/jpeg'
+            # Байты — во внешнее хранилище, в БД только ссылка
+            storage_url = put_stored_file(full_body_photo_bytes, f"body/{user.id}/{unique_filename}", content_type)
+
             new_file = UploadedFile(
                 filename=unique_filename,
-                content_type=file.mimetype or 'image/jpeg',
-                data=full_body_photo_bytes,
+                content_type=content_type,
+                data=b"",
+                storage_url=storage_url,
                 size=len(full_body_photo_bytes),
                 user_id=user.id
             )
@@ -2835,6 +2913,18 @@ def onboarding_generate_visualization():
             db.session.commit()
         # ---------------------------------------------------------------------
 
+        # Асинхронный режим: генерация уходит в фон, клиент опрашивает status_url
+        async_mode = _wants_async()
+
+        if not async_mode:
+            # AI Генерация — до любых записей в БД, чтобы не держать транзакцию открытой на время вызова модели
+            before_filename, after_filename, new_files, provider = generate_for_user(
+                user=user,
+                avatar_bytes=full_body_photo_bytes,
+                metrics_current=metrics_current,
+                metrics_target=metrics_target
+            )
+
         # Сохраняем "Точку А" на основе 3-х параметров
         analysis = BodyAnalysis(
             user_id=user.id,
@@ -2848,25 +2938,19 @@ def onboarding_generate_visualization():
         db.session.flush()
         user.initial_body_analysis_id = analysis.id
 
-        # Рассчитываем целевую "Точку Б"
-        metrics_current["sex"] = user.sex
-        metrics_target = _calculate_target_metrics(user, metrics_current)
-
         user.fat_mass_goal = metrics_target.get("fat_mass")
         user.muscle_mass_goal = metrics_target.get("muscle_mass")
 
-        # AI Генерация
-        before_filename, after_filename = generate_for_user(
-            user=user,
-            avatar_bytes=full_body_photo_bytes,
-            metrics_current=metrics_current,
-            metrics_target=metrics_target
-        )
+        if async_mode:
+            db.session.commit()
+            submit_generation(app, viz_record.id, user.id, full_body_photo_bytes, metrics_current, metrics_target)
+            return _visualization_pending(viz_record)
 
+        # Анализ, цели, файлы и запись визуализации — одним коротким коммитом
         create_record(user=user, curr_filename=before_filename, tgt_filename=after_filename,
-                      metrics_current=metrics_current, metrics_target=metrics_target)
+                      metrics_current=metrics_current, metrics_target=metrics_target,
+                      new_files=new_files, vis=viz_record, provider=provider)
 
-        db.session.commit()
         return jsonify({
             "success": True,
             "before_photo_url": url_for('serve_file', filename=before_filename),
@@ -2874,6 +2958,8 @@ def onboarding_generate_visualization():
         })
     except Exception as e:
         db.session.rollback()
+        if viz_record is not None:
+            fail_record(viz_record, e)
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -3791,7 +3877,7 @@ def confirm_analysis():
                             existing_score = SquadScoreLog.query.filter(
                                 SquadScoreLog.user_id == user.id,
                                 SquadScoreLog.category == 'healthy_progress',
-                                func.date(SquadScoreLog.created_at) >= start_of_week
+                                SquadScoreLog.created_at >= _day_start(start_of_week)
                             ).first()
                             if not existing_score:
                                 award_squad_points(user, 'healthy_progress', 30, "Здоровый прогресс веса")
@@ -4505,7 +4591,8 @@ def admin_dashboard():
     # Активность за сегодня
     today = datetime.now(ZoneInfo("Asia/Almaty")).date()
     meals_today = db.session.query(func.count(func.distinct(MealLog.user_id))).filter(
-        func.date(MealLog.created_at) == today).scalar() or 0
+        MealLog.created_at >= _day_start(today),
+        MealLog.created_at < _day_start(today + timedelta(days=1))).scalar() or 0
     activity_today = Activity.query.filter_by(date=today).count()
 
     # Фильтрация и пагинация пользователей
@@ -4565,7 +4652,7 @@ def admin_squads_control():
         # Сумма баллов сквада за неделю
         weekly_score = db.session.query(func.sum(SquadScoreLog.points)).filter(
             SquadScoreLog.group_id == g.id,
-            func.date(SquadScoreLog.created_at) >= start_of_week
+            SquadScoreLog.created_at >= _day_start(start_of_week)
         ).scalar() or 0
 
         squads_data.append({
@@ -5271,7 +5358,7 @@ def group_detail(group_id):
         func.sum(SquadScoreLog.points).label('total')
     ).filter(
         SquadScoreLog.group_id == group.id,
-        func.date(SquadScoreLog.created_at) >= start_of_week
+        SquadScoreLog.created_at >= _day_start(start_of_week)
     ).group_by(SquadScoreLog.user_id).all()
 
     score_map = {uid: int(total) for uid, total in scores}
@@ -5721,7 +5808,7 @@ def api_my_group():
         # Считаем сумму баллов за текущую неделю
         weekly_score = db.session.query(func.sum(SquadScoreLog.points)).filter(
             SquadScoreLog.user_id == m.user.id,
-            func.date(SquadScoreLog.created_at) >= start_of_week
+            SquadScoreLog.created_at >= _day_start(start_of_week)
         ).scalar() or 0
 
         members_data.append({
@@ -6238,7 +6325,7 @@ def deficit_history():
     # Получаем замеры
     body_analyses = BodyAnalysis.query.filter(
         BodyAnalysis.user_id == user.id,
-        func.date(BodyAnalysis.timestamp) >= start_datetime.date()
+        BodyAnalysis.timestamp >= _day_start(start_datetime.date())
     ).all()
     analysis_map = {b.timestamp.date(): b for b in body_analyses}
 
@@ -6802,7 +6889,7 @@ def visualize_page():
             'motivation_text': motivation_text  # Добавляем сообщение в словарь
         }
 
-    latest_visualization = BodyVisualization.query.filter_by(user_id=u.id).order_by(BodyVisualization.id.desc()).first()
+    latest_visualization = BodyVisualization.query.filter_by(user_id=u.id, status="done").order_by(BodyVisualization.id.desc()).first()
 
     return render_template(
         'visualize.html',
@@ -6812,6 +6899,46 @@ def visualize_page():
     )
 
 
+def _visualization_json(viz):
+    return {
+        "id": viz.id,
+        "status": viz.status,
+        "image_current_path": url_for('serve_file', filename=viz.image_current_path),
+        "image_target_path": url_for('serve_file', filename=viz.image_target_path),
+        "created_at": viz.created_at.strftime('%d.%m.%Y %H:%M')
+    }
+
+
+def _visualization_pending(viz, error=None):
+    """202 для ещё не готовой визуализации: куда ходить за статусом."""
+    body = {"success": False, "status": "pending", "id": viz.id,
+            "status_url": url_for('visualize_status', viz_id=viz.id)}
+    if error:
+        body["error"] = error
+    return jsonify(body), 202
+
+
+def _wants_async():
+    """Клиент просит не ждать генерацию: заголовок Prefer: respond-async или ?async=1."""
+    return "respond-async" in request.headers.get("Prefer", "") or request.args.get("async") == "1"
+
+
+def _track_visualization_generated(user_id, metrics_current, metrics_target):
+    # ANALYTICS: Body Visualization Generated
+    try:
+        amplitude.track(BaseEvent(
+            event_type="Body Visualization Generated",
+            user_id=str(user_id),
+            event_properties={
+                "current_weight": metrics_current.get("weight_kg"),
+                "target_weight": metrics_target.get("weight_kg"),
+                "sex": metrics_current.get("sex")
+            }
+        ))
+    except Exception as e:
+        print(f"Amplitude error: {e}")
+
+
 @app.route('/visualize/run', methods=['POST'])
 @login_required
 def visualize_run():
@@ -6833,11 +6960,11 @@ def visualize_run():
 
     # 1. Проверяем наличие фото в полный рост
     if getattr(u, 'full_body_photo', None):
-        avatar_bytes = u.full_body_photo.data
+        avatar_bytes = read_stored_file(u.full_body_photo)
 
     # 2. Если нет, берем аватар (как запасной вариант)
     elif u.avatar:
-        avatar_bytes = u.avatar.data
+        avatar_bytes = read_stored_file(u.avatar)
 
     if not avatar_bytes:
         # Если у пользователя нет ни фото тела, ни аватара, загружаем дефолтный из static
@@ -6878,54 +7005,69 @@ def visualize_run():
         metrics_target["fat_pct"] = _compute_pct(fat_mass_goal, target_weight)
         metrics_target["muscle_pct"] = _compute_pct(muscle_mass_goal, target_weight)
 
+    # Повтор того же запроса не запускает вторую генерацию
+    viz_record, should_generate = begin_record(u, avatar_bytes, metrics_current, metrics_target)
+    if not should_generate:
+        if viz_record.status == "pending":
+            return _visualization_pending(viz_record, "Визуализация уже генерируется, подождите.")
+        return jsonify({"success": True, "visualization": _visualization_json(viz_record)})
+
+    # Асинхронный режим: воркер освобождается сразу, клиент опрашивает status_url
+    if _wants_async():
+        submit_generation(app, viz_record.id, u.id, avatar_bytes, metrics_current, metrics_target,
+                          on_done=_track_visualization_generated)
+        return _visualization_pending(viz_record)
+
     try:
         # Вызываем обновленную функцию, передавая байты аватара
-        current_image_filename, target_image_filename = generate_for_user(
+        current_image_filename, target_image_filename, new_files, provider = generate_for_user(
             user=u,
             avatar_bytes=avatar_bytes,
             metrics_current=metrics_current,
             metrics_target=metrics_target
         )
 
-        # Функция create_record теперь принимает имена файлов
+        # Функция create_record теперь принимает имена файлов и сохраняет новые файлы вместе с записью
         new_viz_record = create_record(
             user=u,
             curr_filename=current_image_filename,
             tgt_filename=target_image_filename,
             metrics_current=metrics_current,
-            metrics_target=metrics_target
+            metrics_target=metrics_target,
+            new_files=new_files,
+            vis=viz_record,
+            provider=provider
         )
 
-        # Используем новый маршрут 'serve_file'
+        _track_visualization_generated(u.id, metrics_current, metrics_target)
 
-        # ANALYTICS: Body Visualization Generated
-        try:
-            amplitude.track(BaseEvent(
-                event_type="Body Visualization Generated",
-                user_id=str(u.id),  # <--- ИСПРАВЛЕНО: user -> u
-                event_properties={
-                    "current_weight": metrics_current.get("weight_kg"),
-                    "target_weight": metrics_target.get("weight_kg"),
-                    "sex": metrics_current.get("sex")
-                }
-            ))
-        except Exception as e:
-            print(f"Amplitude error: {e}")
-
-        return jsonify({
-            "success": True,
-            "visualization": {
-                "image_current_path": url_for('serve_file', filename=new_viz_record.image_current_path),
-                "image_target_path": url_for('serve_file', filename=new_viz_record.image_target_path),
-                "created_at": new_viz_record.created_at.strftime('%d.%m.%Y %H:%M')
-            }
-        })
+        return jsonify({"success": True, "visualization": _visualization_json(new_viz_record)})
 
     except Exception as e:
         app.logger.error("[visualize] generation failed: %s", e, exc_info=True)
-        db.session.rollback()  # Откатываем транзакцию в случае ошибки
+        fail_record(viz_record, e)  # Откатываем транзакцию и освобождаем ключ для повтора
         return jsonify({"success": False, "error": f"Не удалось сгенерировать визуализацию: {e}"}), 500
 
+
+@app.route('/visualize/status/<int:viz_id>', methods=['GET'])
+@login_required
+def visualize_status(viz_id):
+    """Статус визуализации для асинхронного режима /visualize/run."""
+    u = get_current_user()
+    if not u:
+        abort(401)
+    viz = BodyVisualization.query.filter_by(id=viz_id, user_id=u.id).first_or_404()
+    if viz.status == "pending":
+        if viz.created_at > datetime.utcnow() - _PENDING_TTL:
+            return _visualization_pending(viz)
+        # Воркер умер вместе с генерацией — не держим клиента в вечном поллинге, ключ освобождаем
+        fail_record(viz, TimeoutError("generation timed out"))
+    if viz.status != "done":
+        return jsonify({"success": False, "status": viz.status, "id": viz.id,
+                        "error": "Не удалось сгенерировать визуализацию."}), 200
+    return jsonify({"success": True, "status": "done", "visualization": _visualization_json(viz)})
+
+
 # ===== ADMIN: Аудит =====
 
 @app.route("/admin/audit")
@@ -7121,18 +7263,19 @@ def serve_file(filename):
         response.headers['Cache-Control'] = 'public, max-age=31536000, immutable' # Кэш на 1 год
         return response
 
-    # 2. Если на диске нет, достаем BLOB из базы
+    # 2. Если на диске нет, достаем BLOB из базы (или из внешнего хранилища)
     f = UploadedFile.query.filter_by(filename=filename).first_or_404()
+    file_bytes = read_stored_file(f)
 
     # 3. Выгружаем на диск, чтобы в следующий раз Nginx или этот же код отдал его мгновенно
     try:
         with open(filepath, 'wb') as disk_file:
-            disk_file.write(f.data)
+            disk_file.write(file_bytes)
     except Exception as e:
         app.logger.error(f"Не удалось сохранить файл на диск: {e}")
 
     # 4. Отдаем файл в первый раз из памяти
-    response = make_response(send_file(BytesIO(f.data), mimetype=f.content_type))
+    response = make_response(send_file(BytesIO(file_bytes), mimetype=f.content_type))
     response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
     return response
 
@@ -8140,8 +8283,8 @@ def get_weekly_stories(group_id):
             func.sum(SquadScoreLog.points).label('total')
         ).filter(
             SquadScoreLog.group_id == group_id,
-            func.date(SquadScoreLog.created_at) >= start_date,
-            func.date(SquadScoreLog.created_at) <= end_date
+            SquadScoreLog.created_at >= _day_start(start_date),
+            SquadScoreLog.created_at < _day_start(end_date + timedelta(days=1))
         ).group_by(SquadScoreLog.user_id).order_by(text('total DESC')).limit(3).all()
 
         if not scores:
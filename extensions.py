@@ -1,5 +1,7 @@
 # extensions.py
 import os
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
 from flask_sqlalchemy import SQLAlchemy
 
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///35healthclubs.db")
@@ -10,3 +12,11 @@ if DB_URL.startswith("postgresql") and "sslmode=" not in DB_URL:
     engine_options["connect_args"] = {"sslmode": "require"}
 
 db = SQLAlchemy(engine_options=engine_options)
+
+# Лимиты запросов (через Redis для работы с Gunicorn). Живут здесь, чтобы блюпринты
+# могли вешать @limiter.limit без импорта app; к приложению подключаются через init_app
+limiter = Limiter(
+    get_remote_address,
+    default_limits=["5000 per day", "500 per hour"],
+    storage_uri=os.getenv("REDIS_URL", "redis://localhost:6379/0")
+)
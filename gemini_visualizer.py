@@ -1,36 +1,120 @@
 import os
 import io
+import atexit
+import json
 import time
-from datetime import datetime
-from typing import Tuple, Dict
+import hashlib
+import itertools
+import threading
+from datetime import datetime, timedelta
+from typing import Tuple, Dict, List, Optional
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 
-from PIL import Image
+import httpx
+from cachetools import LRUCache
+from PIL import Image, ImageOps
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types
+from sqlalchemy import delete, text, update
+from sqlalchemy.exc import IntegrityError
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 
+import storage
 from extensions import db
-from models import BodyVisualization, UploadedFile
+from models import BodyVisualization, UploadedFile, User, VisualizationCache
 
 # Убедитесь, что эта модель доступна в вашем регионе/аккаунте
 MODEL_NAME = "gemini-2.5-flash-image"
+# Конфиг генерации одинаков для всех вызовов — собираем один раз.
+# temperature=0.0: жесткая консистентность генерации (минимум рандома)
+_GENERATION_CONFIG = types.GenerateContentConfig(temperature=0.0)
+
+# Запасная модель на время сбоев основной (необязательно)
+FALLBACK_MODEL_NAME = os.getenv("GEMINI_FALLBACK_MODEL")
+
+# Один клиент на процесс: переиспользуем пул HTTP-соединений (keep-alive) между запросами
+_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+# Пул для вызовов модели и загрузки результата в хранилище: обе картинки одного запроса
+# идут одновременно. С сессией БД здесь не работаем
+_GEN_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="viz-gen")
+# Сколько ждём все картинки запроса (вместе с ретраями), прежде чем считать недоделанные упавшими
+_GENERATION_TIMEOUT_SEC = 120
+
+# Фоновые генерации (асинхронный режим): веб-воркер не ждёт модель 20-60 секунд
+_JOB_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="viz-job")
+
+# Кэш готовых изображений: ключ -> имя файла в UploadedFile.
+# Два уровня: точный (метрики как есть) и «семантический» (метрики, округлённые до корзин).
+# Аватар входит в оба ключа — чужое лицо никогда не попадёт в выдачу другому пользователю.
+_RESULT_CACHE = LRUCache(maxsize=2000)
+_RESULT_CACHE_LOCK = threading.Lock()
+
+# Предохранитель: после _BREAKER_FAIL_MAX ошибок подряд основную модель не дёргаем
+# _BREAKER_RESET_SEC секунд, сразу идём в запасную модель / ближайшую картинку из кэша
+_BREAKER_FAIL_MAX = 5
+_BREAKER_RESET_SEC = 60
+
+# Длинная сторона фото-референса, которое уходит в модель. Телефонные фото (5-10 МБ)
+# модели не нужны целиком — поза и лицо читаются и с уменьшенной копии.
+_AVATAR_MAX_SIDE = 1024
+
+# Уменьшенные фото-референсы по sha256 исходника: один и тот же аватар не декодируем
+# и не пережимаем заново на каждый запрос (~100-200 КБ на запись)
+_AVATAR_CACHE = LRUCache(maxsize=64)
+_AVATAR_CACHE_LOCK = threading.Lock()
+
+# Single-flight: одинаковые генерации, идущие одновременно, выполняются один раз,
+# остальные запросы ждут результат первого. Ключ — точный ключ кэша.
+_INFLIGHT: Dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+# Сколько «pending»-запись держит ключ идемпотентности; дольше — считаем попытку брошенной
+_PENDING_TTL = timedelta(minutes=10)
+
+# Шаги квантования: рост 5 см, вес 2 кг, жир 2 %, мышцы 2 %
+_BUCKET_STEPS = (("height", 5), ("weight", 2), ("fat_pct", 2), ("muscle_pct", 2))
+
+def _get_client() -> genai.Client:
+    """Лениво создаёт общий genai.Client (потокобезопасно)."""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    raise RuntimeError("GOOGLE_API_KEY is not set")
+                _CLIENT = genai.Client(api_key=api_key)
+                atexit.register(_close_client)
+    return _CLIENT
 
-def _build_prompt(sex: str, metrics: Dict[str, float], variant_label: str, scene_id: str) -> str:
-    """
-    Финальная версия промпта со строгим контролем масштаба, фона и ИМТ.
-    """
-    height = metrics.get("height", 170)
-    weight = metrics.get("weight", 70)
-    fat_pct = metrics.get("fat_pct", 20)
-    muscle_pct = metrics.get("muscle_pct", 40)
-    bmi = metrics.get("bmi", 22.0)
 
-    if sex == 'female':
-        clothing_description = "Plain black sports bra (top) and plain black athletic shorts. Simple, functional, no logos, no embellishments. Matte fabric."
-    else:  # male
-        clothing_description = "Plain black athletic shorts, bare torso. Simple, functional, no logos, no embellishments. Matte fabric."
+def _close_client() -> None:
+    """Закрывает пул HTTP-соединений клиента при остановке процесса."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        client, _CLIENT = _CLIENT, None
+    if client is not None:
+        try:
+            client.close()
+        except Exception as e:
+            print(f"[viz] client close failed: {e}")
 
-    return f"""
+
+_CLOTHING = {
+    "female": "Plain black sports bra (top) and plain black athletic shorts. Simple, functional, no logos, no embellishments. Matte fabric.",
+    "male": "Plain black athletic shorts, bare torso. Simple, functional, no logos, no embellishments. Matte fabric.",
+}
+
+# Версия промпта входит в ключи кэша: меняете текст промпта — увеличьте её,
+# и картинки, сделанные по старому промпту, перестанут находиться
+PROMPT_VERSION = 1
+
+_PROMPT_TEMPLATE = """
 # PRIMARY OBJECTIVE
 You are an expert clinical AI visualizer. Your task is to perform a highly accurate image-to-image translation. 
 You must modify the body composition of the person in the provided reference image STRICTLY based on the physical metrics below.
@@ -42,10 +126,10 @@ You must modify the body composition of the person in the provided reference ima
 1. **Scale & Framing:** The subject MUST remain the EXACT SAME SIZE and at the EXACT SAME DISTANCE from the camera as in the reference image. DO NOT zoom in or out. Head and feet MUST remain exactly where they are in the original.
 2. **Background & Environment:** PRESERVE the original background, room, shadows, and lighting completely. Do NOT generate a white studio background unless the original photo is already white. Modifying the background is strictly prohibited.
 3. **Pose:** The pose MUST remain absolutely identical to the original image.
-4. **Clothing:** {clothing_description}
+4. **Clothing:** {clothing}
 5. **Identity:** The face MUST be an EXACT, UNALTERED match to the provided avatar image.
 
-# BODY SPECIFICATION FOR "{variant_label.upper()}" STATE
+# BODY SPECIFICATION FOR "{label}" STATE
 - **Sex:** {sex}
 - **Height:** {height} cm
 - **Weight:** {weight} kg
@@ -63,6 +147,39 @@ You must modify the body composition of the person in the provided reference ima
 Output MUST be an authentic, unedited, high-resolution synthesized photograph matching the input dimensions and framing perfectly.
 """.strip()
 
+# Шаблон, специализированный под пол, собираем один раз при импорте —
+# на запрос остаётся только подставить метрики.
+_PROMPT_TEMPLATES = {
+    sex: _PROMPT_TEMPLATE.replace("{clothing}", clothing) for sex, clothing in _CLOTHING.items()
+}
+
+
+@dataclass(slots=True)
+class BodyMetrics:
+    """Нормализованные метрики одного состояния тела: вход промпта и ключей кэша."""
+    height: float = 170
+    weight: float = 70
+    fat_pct: Optional[float] = 20
+    muscle_pct: Optional[float] = 40
+    bmi: float = 22.0
+
+
+def _build_prompt(sex: str, metrics: BodyMetrics, variant_label: str, scene_id: str) -> str:
+    """
+    Финальная версия промпта со строгим контролем масштаба, фона и ИМТ.
+    """
+    template = _PROMPT_TEMPLATES["female" if sex == "female" else "male"]
+    return template.format(
+        scene_id=scene_id,
+        label=variant_label.upper(),
+        sex=sex,
+        height=metrics.height,
+        weight=metrics.weight,
+        bmi=metrics.bmi,
+        fat_pct=metrics.fat_pct,
+        muscle_pct=metrics.muscle_pct,
+    )
+
 def _extract_first_image_bytes(response) -> bytes:
     if not response or not getattr(response, "candidates", []):
         raise RuntimeError("No candidates returned by Gemini model.")
@@ -75,17 +192,275 @@ def _extract_first_image_bytes(response) -> bytes:
 
     raise RuntimeError("No image data found in response parts.")
 
-def _save_png_to_db(raw_bytes: bytes, user_id: int, base_name: str) -> str:
-    unique_filename = f"viz_{user_id}_{base_name}_{uuid.uuid4().hex}.png"
-    new_file = UploadedFile(
+def _recompress(png_bytes: bytes) -> bytes:
+    """Пережимает PNG от модели в WebP (q85): визуально то же фото, в разы меньше байт."""
+    img = Image.open(io.BytesIO(png_bytes))
+    buf = io.BytesIO()
+    img.save(buf, format="WEBP", quality=85, method=6)
+    return buf.getvalue()
+
+
+def _prepare_avatar(avatar_bytes: bytes) -> bytes:
+    """Уменьшает фото-референс до _AVATAR_MAX_SIDE и пережимает в JPEG (q85)."""
+    try:
+        img = ImageOps.exif_transpose(Image.open(io.BytesIO(avatar_bytes)))
+        img.thumbnail((_AVATAR_MAX_SIDE, _AVATAR_MAX_SIDE))
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, format="JPEG", quality=85)
+        return buf.getvalue()
+    except Exception as e:
+        # Не смогли разобрать картинку — отдаём как есть, пусть решает модель
+        print(f"[viz] avatar downscale skipped: {e}")
+        return avatar_bytes
+
+
+class _CircuitBreaker:
+    """Простейший предохранитель: closed -> open после серии ошибок -> пробный вызов после паузы."""
+
+    def __init__(self, fail_max: int, reset_timeout: float):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._failures < self.fail_max:
+                return True
+            # Пауза прошла — пропускаем пробный вызов, при ошибке снова откроемся на reset_timeout
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self._failures = 0
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.fail_max:
+                self._opened_at = time.monotonic()
+
+
+_BREAKER = _CircuitBreaker(_BREAKER_FAIL_MAX, _BREAKER_RESET_SEC)
+
+
+def _avatar_part(avatar_bytes: bytes, avatar_digest: str):
+    """Part с подготовленным фото-референсом; подготовка кэшируется по хэшу содержимого."""
+    with _AVATAR_CACHE_LOCK:
+        prepared = _AVATAR_CACHE.get(avatar_digest)
+    if prepared is None:
+        prepared = _prepare_avatar(avatar_bytes)
+        with _AVATAR_CACHE_LOCK:
+            _AVATAR_CACHE[avatar_digest] = prepared
+    return types.Part(inline_data=types.Blob(mime_type="image/jpeg", data=prepared))
+
+
+def _is_transient(error: BaseException) -> bool:
+    """Стоит ли повторять: перегрузка (429), ошибки сервера (5xx) и сетевые сбои."""
+    if isinstance(error, genai_errors.ServerError):
+        return True
+    if isinstance(error, genai_errors.ClientError):
+        return error.code == 429
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+@retry(
+    retry=retry_if_exception(_is_transient),
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=1, max=8),
+    reraise=True,
+)
+def _generate_image(client, avatar_part, prompt: str, model: str = MODEL_NAME) -> bytes:
+    """Один вызов модели: аватар + промпт -> PNG."""
+    response = client.models.generate_content(
+        model=model,
+        contents=[avatar_part, types.Part(text=prompt)],
+        config=_GENERATION_CONFIG
+    )
+    return _extract_first_image_bytes(response)
+
+
+def _generate_guarded(client, avatar_part, prompt: str) -> Tuple[bytes, str]:
+    """
+    Основная модель через предохранитель, при сбое — запасная (если задана).
+    Возвращает PNG и имя модели, которая его сделала.
+    """
+    error = None
+    if _BREAKER.allow():
+        try:
+            png = _generate_image(client, avatar_part, prompt)
+            _BREAKER.success()
+            return png, MODEL_NAME
+        except Exception as e:
+            _BREAKER.failure()
+            print(f"[viz] {MODEL_NAME} failed: {e}")
+            error = e
+
+    if FALLBACK_MODEL_NAME:
+        return _generate_image(client, avatar_part, prompt, FALLBACK_MODEL_NAME), FALLBACK_MODEL_NAME
+    raise error or RuntimeError(f"{MODEL_NAME} временно недоступна")
+
+
+def _single_flight(key: str, fn, *args):
+    """Выполняет fn(*args) один раз на ключ среди одновременных вызовов; остальные получают тот же результат."""
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _INFLIGHT[key] = future
+
+    if not is_owner:
+        return future.result()
+
+    try:
+        result = fn(*args)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
+
+def _store_png(raw_bytes: bytes, user_id: int, base_name: str,
+               abandoned: Optional[threading.Event] = None) -> UploadedFile:
+    """
+    Пережимает PNG в WebP, загружает во внешнее хранилище и возвращает ещё не
+    добавленную в сессию запись UploadedFile (без байтов). Безопасно вызывать из пула потоков.
+    Если запрос уже бросил ожидание (abandoned), в хранилище ничего не пишем — файл никто не сохранит.
+    """
+    webp_bytes = _recompress(raw_bytes)
+    if abandoned is not None and abandoned.is_set():
+        raise TimeoutError("visualization request abandoned")
+    unique_filename = f"viz_{user_id}_{base_name}_{uuid.uuid4().hex}.webp"
+    url = storage.put_file(webp_bytes, f"viz/{user_id}/{unique_filename}", "image/webp")
+    return UploadedFile(
         filename=unique_filename,
-        content_type='image/png',
-        data=raw_bytes,
-        size=len(raw_bytes),
+        content_type='image/webp',
+        data=b"",
+        storage_url=url,
+        size=len(webp_bytes),
         user_id=user_id
     )
-    db.session.add(new_file)
-    return unique_filename
+
+def _render_and_store(key: str, client, avatar_part, prompt: str, user_id: int, base_name: str,
+                      abandoned: Optional[threading.Event] = None) -> Tuple[UploadedFile, str]:
+    """Генерирует картинку (single-flight по ключу) и сразу сохраняет её; возвращает файл и модель."""
+    png, model = _single_flight(key, _generate_guarded, client, avatar_part, prompt)
+    return _store_png(png, user_id, base_name, abandoned), model
+
+
+def _quantize(value, step: int) -> int:
+    return int(round(float(value or 0) / step) * step)
+
+
+def _bucket_key(avatar_digest: str, sex: str, variant_label: str, buckets: List[int]) -> str:
+    bucket = [PROMPT_VERSION, avatar_digest, variant_label, sex] + list(buckets)
+    return hashlib.sha256(json.dumps(bucket).encode()).hexdigest()
+
+
+def _cache_keys(avatar_digest: str, sex: str, metrics: BodyMetrics, variant_label: str) -> Tuple[str, str]:
+    """Возвращает (точный, семантический) ключи кэша для одного состояния тела."""
+    exact = [PROMPT_VERSION, avatar_digest, variant_label, sex] + \
+            [getattr(metrics, name) for name, _ in _BUCKET_STEPS] + [metrics.bmi]
+    buckets = [_quantize(getattr(metrics, name), step) for name, step in _BUCKET_STEPS]
+    return (
+        hashlib.sha256(json.dumps(exact, default=str).encode()).hexdigest(),
+        _bucket_key(avatar_digest, sex, variant_label, buckets),
+    )
+
+
+def _nearest_cached(avatar_digest: str, sex: str, metrics: BodyMetrics, variant_label: str) -> Optional[str]:
+    """Ищет в кэше картинку из соседних корзин (±1 шаг по каждой метрике), ближайшие — первыми."""
+    base = [_quantize(getattr(metrics, name), step) for name, step in _BUCKET_STEPS]
+    offsets = sorted(itertools.product((-1, 0, 1), repeat=len(_BUCKET_STEPS)),
+                     key=lambda o: sum(map(abs, o)))
+    keys = tuple(
+        _bucket_key(avatar_digest, sex, variant_label,
+                    [value + d * step for value, d, (_, step) in zip(base, offset, _BUCKET_STEPS)])
+        for offset in offsets
+    )
+    return _cache_get(keys)
+
+
+def _cache_get(keys: Tuple[str, ...]) -> Optional[str]:
+    """
+    Ищет изображение по ключам в порядке приоритета: сначала в памяти процесса,
+    затем в общей таблице visualization_cache. Файл должен ещё существовать в БД.
+    """
+    for key in keys:
+        with _RESULT_CACHE_LOCK:
+            filename = _RESULT_CACHE.get(key)
+        if not filename:
+            continue
+        if db.session.query(UploadedFile.id).filter_by(filename=filename).first():
+            return filename
+        with _RESULT_CACHE_LOCK:
+            _RESULT_CACHE.pop(key, None)
+
+    # Общий кэш: одним запросом по всем ключам, только для файлов, которые ещё на месте
+    rows = dict(
+        db.session.query(VisualizationCache.cache_key, VisualizationCache.filename)
+        .join(UploadedFile, UploadedFile.filename == VisualizationCache.filename)
+        .filter(VisualizationCache.cache_key.in_(keys))
+        .all()
+    )
+    for key in keys:
+        filename = rows.get(key)
+        if filename:
+            with _RESULT_CACHE_LOCK:
+                _RESULT_CACHE[key] = filename
+            _touch_shared(key)
+            return filename
+    return None
+
+
+def _touch_shared(key: str) -> None:
+    """Счётчик попаданий и время последнего использования — отдельной короткой транзакцией."""
+    try:
+        with db.engine.begin() as con:
+            con.execute(
+                update(VisualizationCache)
+                .where(VisualizationCache.cache_key == key)
+                .values(hits=VisualizationCache.hits + 1, last_used=datetime.utcnow())
+            )
+    except Exception as e:
+        print(f"[viz] cache touch failed: {e}")
+
+
+def _cache_put(keys: Tuple[str, str], filename: str, shared: bool = True) -> None:
+    with _RESULT_CACHE_LOCK:
+        for key in keys:
+            _RESULT_CACHE[key] = filename
+    if not shared:
+        return
+    # Пишем в общий кэш мимо сессии запроса: ошибка здесь не должна ронять визуализацию
+    try:
+        with db.engine.begin() as con:
+            for key in keys:
+                con.execute(text(
+                    "INSERT INTO visualization_cache (cache_key, filename, hits, last_used) "
+                    "VALUES (:key, :filename, 0, :now) "
+                    "ON CONFLICT (cache_key) DO UPDATE SET filename = excluded.filename, last_used = excluded.last_used"
+                ), {"key": key, "filename": filename, "now": datetime.utcnow()})
+    except Exception as e:
+        print(f"[viz] shared cache put failed: {e}")
+
+
+def prune_cache(max_age_days: int = 30) -> int:
+    """Удаляет из общего кэша записи, которые не использовались max_age_days дней."""
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+    with db.engine.begin() as con:
+        result = con.execute(delete(VisualizationCache).where(VisualizationCache.last_used < cutoff))
+    return result.rowcount
+
 
 def _compute_pct(value: float, weight: float) -> float:
     if not value or not weight or weight <= 0:
@@ -99,90 +474,257 @@ def _compute_bmi(weight: float, height: float) -> float:
     return round(weight / ((height / 100.0) ** 2), 1)
 
 
+def _prepare_metrics(metrics: Dict[str, float], default_height: float) -> BodyMetrics:
+    """
+    Нормализует метрики одного состояния для промпта и ключей кэша.
+    Понимает оба набора ключей: height/weight (онбординг) и height_cm/weight_kg (страница визуализации).
+    Проценты считаются от масс, если они переданы, иначе берутся готовые.
+    """
+    height = metrics.get("height") or metrics.get("height_cm") or default_height
+    weight = metrics.get("weight") or metrics.get("weight_kg") or 0
+    fat_mass = metrics.get("fat_mass")
+    muscle_mass = metrics.get("muscle_mass")
+    return BodyMetrics(
+        height=height,
+        weight=weight,
+        fat_pct=_compute_pct(fat_mass, weight) if fat_mass else metrics.get("fat_pct"),
+        muscle_pct=_compute_pct(muscle_mass, weight) if muscle_mass else metrics.get("muscle_pct"),
+        bmi=_compute_bmi(weight, height),
+    )
+
+
+def _prepare_pair(metrics_current: Dict, metrics_target: Dict, default_height: float) -> \
+Tuple[BodyMetrics, BodyMetrics]:
+    """Метрики Точки А и Точки Б в том виде, в каком они идут в промпт и ключи кэша."""
+    # 1. Подготовка ТЕКУЩИХ метрик (Точка А)
+    curr = _prepare_metrics(metrics_current, default_height)
+    if curr.fat_pct is None:
+        curr.fat_pct = 0.0
+    if not curr.muscle_pct:
+        # Мышцы не измерены — считаем 40% от веса
+        curr.muscle_pct = 40.0 if curr.weight else 0.0
+
+    # 2. Подготовка ЦЕЛЕВЫХ метрик (Точка Б)
+    tgt = _prepare_metrics(metrics_target, curr.height)
+    return curr, tgt
+
+
+def warm_cache(limit: int = 5000) -> int:
+    """
+    Наполняет кэш картинок по истории готовых визуализаций (новые — последними, чтобы
+    жили в LRU дольше). Хранятся только имена файлов; их наличие проверяет _cache_get.
+    Возвращает число прогретых записей.
+    """
+    rows = (
+        db.session.query(BodyVisualization.image_current_path, BodyVisualization.image_target_path,
+                         BodyVisualization.metrics_current, BodyVisualization.metrics_target,
+                         BodyVisualization.avatar_hash, User.sex, User.height)
+        .join(User, User.id == BodyVisualization.user_id)
+        .filter(BodyVisualization.status == "done", BodyVisualization.avatar_hash.isnot(None))
+        .order_by(BodyVisualization.id.desc())
+        .limit(limit)
+        .all()
+    )
+    warmed = 0
+    for curr_file, tgt_file, m_curr, m_tgt, avatar_hash, sex, height in reversed(rows):
+        try:
+            curr, tgt = _prepare_pair(m_curr or {}, m_tgt or {}, height or 170)
+        except (TypeError, ValueError):
+            continue
+        sex = sex or "male"
+        _cache_put(_cache_keys(avatar_hash, sex, curr, "current"), curr_file, shared=False)
+        _cache_put(_cache_keys(avatar_hash, sex, tgt, "target"), tgt_file, shared=False)
+        warmed += 1
+    return warmed
+
+
 def generate_for_user(user, avatar_bytes: bytes, metrics_current: Dict[str, float], metrics_target: Dict[str, float]) -> \
-Tuple[str, str]:
+Tuple[str, str, List[UploadedFile], str]:
     """
     Генерирует изображения До и После, нормализуя входные данные для промпта.
+    Возвращает имена файлов, новые записи UploadedFile (их сохраняет create_record)
+    и провайдера для записи визуализации.
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise RuntimeError("GOOGLE_API_KEY is not set")
-
-    client = genai.Client(api_key=api_key)
+    client = _get_client()
     ts = int(time.time())
     scene_id = f"scene-{uuid.uuid4().hex}"
 
-    # 1. Подготовка ТЕКУЩИХ метрик (Точка А)
-    curr_height = metrics_current.get("height") or getattr(user, "height", 170)
-    curr_weight = metrics_current.get("weight", 0)
-    metrics_current["fat_pct"] = _compute_pct(metrics_current.get("fat_mass", 0), curr_weight)
+    curr_data_for_prompt, tgt_data_for_prompt = _prepare_pair(
+        metrics_current, metrics_target, getattr(user, "height", None) or 170)
+    # Посчитанные проценты и ИМТ сохраняются в записи визуализации
+    metrics_current["fat_pct"] = curr_data_for_prompt.fat_pct
+    metrics_current["muscle_pct"] = curr_data_for_prompt.muscle_pct
+    metrics_current["bmi"] = curr_data_for_prompt.bmi
 
-    curr_muscle = metrics_current.get("muscle_mass") or (curr_weight * 0.4)
-    metrics_current["muscle_pct"] = _compute_pct(curr_muscle, curr_weight)
+    sex = user.sex or "male"
+    avatar_digest = hashlib.sha256(avatar_bytes).hexdigest()
 
-    # Считаем точный ИМТ для Точки А
-    metrics_current["bmi"] = _compute_bmi(curr_weight, curr_height)
+    # Цель совпадает с текущим состоянием (например, цели ещё не заданы) — одна картинка на оба слота
+    same_body = curr_data_for_prompt == tgt_data_for_prompt
+    states = {"current": curr_data_for_prompt}
+    if not same_body:
+        states["target"] = tgt_data_for_prompt
+    keys = {label: _cache_keys(avatar_digest, sex, data, label) for label, data in states.items()}
+    filenames = {label: _cache_get(keys[label]) for label in states}
+    # Фото-референс готовим, только если что-то действительно придётся генерировать
+    avatar_part = _avatar_part(avatar_bytes, avatar_digest) if not all(filenames.values()) else None
 
-    # 2. Подготовка ЦЕЛЕВЫХ метрик (Точка Б)
-    tgt_height = metrics_target.get("height_cm") or curr_height
-    tgt_weight = metrics_target.get("weight_kg", 0)
-    tgt_data_for_prompt = {
-        "height": tgt_height,
-        "weight": tgt_weight,
-        "fat_pct": metrics_target.get("fat_pct"),
-        "muscle_pct": metrics_target.get("muscle_pct"),
-        # Считаем точный ИМТ для Точки Б
-        "bmi": _compute_bmi(tgt_weight, tgt_height)
+    # Промахи кэша генерируем параллельно: вызов модели — чистое сетевое ожидание,
+    # так что время ответа — максимум из двух генераций, а не сумма. Сессию БД в пул не передаём.
+    # Генерация, пережатие и загрузка в хранилище — одной задачей в пуле: PNG живёт только внутри неё
+    abandoned = threading.Event()
+    futures = {
+        label: _GEN_POOL.submit(_render_and_store, keys[label][0], client, avatar_part,
+                                _build_prompt(sex, states[label], label, scene_id), user.id, f"{ts}_{label}",
+                                abandoned)
+        for label in states if not filenames[label]
     }
+    # Один общий дедлайн на все картинки; недоделанные отменяем, а начатые не пишут в хранилище
+    _, not_done = wait(futures.values(), timeout=_GENERATION_TIMEOUT_SEC)
+    if not_done:
+        abandoned.set()
+        for future in not_done:
+            future.cancel()
 
-    # Жесткая консистентность генерации (минимум рандома)
-    generation_config = types.GenerateContentConfig(
-        temperature=0.0,
-    )
+    models_used = set()
+    new_files = []
+    error = None
+    for label, future in futures.items():
+        try:
+            if future in not_done:
+                raise TimeoutError(f"{label} image not ready in {_GENERATION_TIMEOUT_SEC}s")
+            new_file, model = future.result()
+        except Exception as e:
+            # Провайдер недоступен — берём ближайшую по метрикам картинку из кэша
+            filenames[label] = _nearest_cached(avatar_digest, sex, states[label], label)
+            if not filenames[label]:
+                error = e
+            else:
+                models_used.add("cache")
+            continue
+        models_used.add(model)
+        new_files.append(new_file)
+        _cache_put(keys[label], new_file.filename)
+        filenames[label] = new_file.filename
 
-    # Генерация текущего состояния
-    prompt_curr = _build_prompt(user.sex or "male", metrics_current, "current", scene_id)
-    contents_curr = [
-        types.Part(inline_data=types.Blob(mime_type="image/jpeg", data=avatar_bytes)),
-        types.Part(text=prompt_curr),
-    ]
-    resp_curr = client.models.generate_content(
-        model=MODEL_NAME,
-        contents=contents_curr,
-        config=generation_config
-    )
-    curr_png = _extract_first_image_bytes(resp_curr)
-
-    # Генерация целевого состояния
-    prompt_tgt = _build_prompt(user.sex or "male", tgt_data_for_prompt, "target", scene_id)
-    contents_tgt = [
-        types.Part(inline_data=types.Blob(mime_type="image/jpeg", data=avatar_bytes)),
-        types.Part(text=prompt_tgt),
-    ]
-    resp_tgt = client.models.generate_content(
-        model=MODEL_NAME,
-        contents=contents_tgt,
-        config=generation_config
-    )
-    tgt_png = _extract_first_image_bytes(resp_tgt)
+    if error is not None:
+        # Удавшуюся картинку сохраняем сразу: она уже в кэше, и повтор запроса
+        # перегенерирует только упавшую часть
+        if new_files:
+            db.session.add_all(new_files)
+            db.session.commit()
+        raise error
+    curr_filename = filenames["current"]
+    tgt_filename = curr_filename if same_body else filenames["target"]
 
-    # Сохранение в БД
-    curr_filename = _save_png_to_db(curr_png, user.id, f"{ts}_current")
-    tgt_filename = _save_png_to_db(tgt_png, user.id, f"{ts}_target")
+    # gemini — штатно; gemini-fallback — часть картинок от запасной модели или из кэша соседних метрик
+    provider = "gemini" if models_used <= {MODEL_NAME} else "gemini-fallback"
+    return curr_filename, tgt_filename, new_files, provider
 
-    return curr_filename, tgt_filename
+def idempotency_key(user_id: int, avatar_bytes: bytes, metrics_current: Dict, metrics_target: Dict) -> str:
+    """Ключ идемпотентности: одинаковый для повторов одного и того же запроса."""
+    payload = json.dumps([user_id, hashlib.sha256(avatar_bytes or b"").hexdigest(),
+                          metrics_current, metrics_target], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def begin_record(user, avatar_bytes: bytes, metrics_current: Dict, metrics_target: Dict) -> \
+Tuple[BodyVisualization, bool]:
+    """
+    Резервирует генерацию под ключом идемпотентности.
+    Возвращает (запись, True) если генерацию нужно запускать, и (существующая запись, False)
+    если такой же запрос уже выполнен ('done') или выполняется прямо сейчас ('pending').
+    """
+    key = idempotency_key(user.id, avatar_bytes, metrics_current, metrics_target)
+    existing = BodyVisualization.query.filter_by(user_id=user.id, idempotency_key=key).first()
+    if existing:
+        fresh = existing.created_at > datetime.utcnow() - _PENDING_TTL
+        if existing.status == "done" or (existing.status == "pending" and fresh):
+            return existing, False
+        # Упавшая или зависшая попытка — освобождаем ключ и пробуем заново
+        existing.idempotency_key = None
+        if existing.status == "pending":
+            existing.status = "error"
+            existing.error = "abandoned"
 
-def create_record(user, curr_filename: str, tgt_filename: str, metrics_current: Dict[str, float],
-                  metrics_target: Dict[str, float]):
     vis = BodyVisualization(
         user_id=user.id,
-        metrics_current=metrics_current,
-        metrics_target=metrics_target,
-        image_current_path=curr_filename,
-        image_target_path=tgt_filename,
-        status="done",
-        provider="gemini"
+        metrics_current=dict(metrics_current),
+        metrics_target=dict(metrics_target),
+        image_current_path="",
+        image_target_path="",
+        status="pending",
+        provider="gemini",
+        idempotency_key=key,
+        avatar_hash=hashlib.sha256(avatar_bytes or b"").hexdigest(),
     )
     db.session.add(vis)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Параллельный повтор успел занять ключ первым — отдаём его запись
+        db.session.rollback()
+        return BodyVisualization.query.filter_by(user_id=user.id, idempotency_key=key).first(), False
+    return vis, True
+
+
+def fail_record(vis: BodyVisualization, error: Exception):
+    """Помечает зарезервированную генерацию как упавшую и освобождает ключ для повтора."""
+    db.session.rollback()
+    vis.status = "error"
+    vis.error = str(error)[:1000]
+    vis.idempotency_key = None
     db.session.commit()
-    return vis
\ No newline at end of file
+
+
+def create_record(user, curr_filename: str, tgt_filename: str, metrics_current: Dict[str, float],
+                  metrics_target: Dict[str, float], new_files: List[UploadedFile] = (),
+                  vis: Optional[BodyVisualization] = None, provider: str = "gemini"):
+    """
+    Сохраняет файлы и запись визуализации одной транзакцией (один flush, один commit).
+    Если передана зарезервированная запись (begin_record) — дописывает её.
+    """
+    if vis is None:
+        vis = BodyVisualization(user_id=user.id, provider="gemini")
+    vis.metrics_current = metrics_current
+    vis.metrics_target = metrics_target
+    vis.image_current_path = curr_filename
+    vis.image_target_path = tgt_filename
+    vis.status = "done"
+    vis.provider = provider
+    try:
+        db.session.add_all([*new_files, vis])
+        db.session.commit()
+    except Exception:
+        # Ничего не оставляем висеть в сессии до конца запроса
+        db.session.rollback()
+        raise
+    return vis
+
+
+def _run_generation_job(app, vis_id: int, user_id: int, avatar_bytes: bytes, metrics_current: Dict,
+                        metrics_target: Dict, on_done=None):
+    with app.app_context():
+        vis = db.session.get(BodyVisualization, vis_id)
+        user = db.session.get(User, user_id)
+        try:
+            curr_filename, tgt_filename, new_files, provider = generate_for_user(
+                user, avatar_bytes, metrics_current, metrics_target)
+            create_record(user, curr_filename, tgt_filename, metrics_current, metrics_target,
+                          new_files=new_files, vis=vis, provider=provider)
+            if on_done:
+                on_done(user_id, metrics_current, metrics_target)
+        except Exception as e:
+            print(f"[viz] background generation {vis_id} failed: {e}")
+            fail_record(vis, e)
+
+
+def submit_generation(app, vis_id: int, user_id: int, avatar_bytes: bytes, metrics_current: Dict,
+                      metrics_target: Dict, on_done=None) -> Future:
+    """
+    Запускает генерацию для зарезервированной записи (begin_record) в фоне.
+    Запись остаётся 'pending' до конца, затем становится 'done' или 'error'.
+    on_done(user_id, metrics_current, metrics_target) вызывается после успешного сохранения.
+    """
+    return _JOB_POOL.submit(_run_generation_job, app, vis_id, user_id, avatar_bytes,
+                            metrics_current, metrics_target, on_done)
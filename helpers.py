@@ -1,11 +1,13 @@
 from flask_login import current_user
+from extensions import db
 from models import User, BodyAnalysis
 
 def get_current_user():
     """Возвращает текущего аутентифицированного пользователя."""
     if current_user.is_authenticated:
-        # Убедимся, что мы возвращаем "живой" объект из сессии SQLAlchemy
-        return User.query.get(current_user.id)
+        # "Живой" объект из сессии SQLAlchemy: если он уже загружен в этом запросе,
+        # db.session.get вернёт его из identity map без повторного SELECT
+        return db.session.get(User, current_user.id)
     return None
 
 
@@ -15,11 +17,33 @@ def _latest_analysis_for(user_id):
 
 
 # --- НОВЫЙ КОД ---
+import threading
+import time
 from functools import wraps
+from cachetools import TTLCache
 from flask import request, jsonify, current_app, g, session
 import jwt
 from models import User
 
+# Уже проверенные JWT: token -> (user_id, exp). Подпись не перепроверяем до минуты,
+# но и не дольше срока жизни самого токена
+_TOKEN_CACHE = TTLCache(maxsize=10_000, ttl=60)
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+
+def _decode_token(token):
+    """Возвращает id пользователя из JWT; бросает исключение, если токен невалиден."""
+    with _TOKEN_CACHE_LOCK:
+        cached = _TOKEN_CACHE.get(token)
+    if cached and (cached[1] is None or cached[1] > time.time()):
+        return cached[0]
+
+    data = jwt.decode(token, current_app.config.get('SECRET_KEY', 'supersecret'), algorithms=["HS256"])
+    user_id = data.get('id')
+    with _TOKEN_CACHE_LOCK:
+        _TOKEN_CACHE[token] = (user_id, data.get('exp'))
+    return user_id
+
 
 def token_required(f):
     @wraps(f)
@@ -39,7 +63,7 @@ def token_required(f):
 
         # 2. Если токена нет, проверяем сессию (для совместимости с текущим вебом)
         if not token and 'user_id' in session:
-            current_user = User.query.get(session['user_id'])
+            current_user = db.session.get(User, session['user_id'])
             if current_user:
                 g.user = current_user
                 return f(*args, **kwargs)
@@ -48,8 +72,8 @@ def token_required(f):
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
-            data = jwt.decode(token, current_app.config.get('SECRET_KEY', 'supersecret'), algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data.get('id')).first()
+            user_id = _decode_token(token)
+            current_user = db.session.get(User, user_id) if user_id is not None else None
             if not current_user:
                 return jsonify({'message': 'User invalid!'}), 401
             g.user = current_user
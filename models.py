@@ -1,6 +1,6 @@
 import json  # <-- Добавлен импорт для работы с JSON в to_dict()
 from datetime import datetime, date, timedelta, time as dt_time
-from sqlalchemy import UniqueConstraint, event
+from sqlalchemy import UniqueConstraint, event, inspect
 from sqlalchemy.sql import expression
 from extensions import db
 
@@ -83,7 +83,9 @@ class User(db.Model):
     subscription = db.relationship(
         'Subscription',
         backref=db.backref('user', uselist=False),
-        uselist=False
+        uselist=False,
+        cascade='all, delete-orphan',
+        passive_deletes=True
     )
 
     avatar_file_id = db.Column(db.Integer, db.ForeignKey('uploaded_files.id'), nullable=True)
@@ -211,7 +213,7 @@ class Subscription(db.Model):
     __tablename__ = "subscription"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), unique=True, nullable=False)
     start_date = db.Column(db.Date, default=date.today)
     end_date = db.Column(db.Date, nullable=True)
     source = db.Column(db.String(50))
@@ -335,7 +337,7 @@ class SquadScoreLog(db.Model):
     __tablename__ = 'squad_score_logs'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
     # Группа, в которой состоял юзер на момент получения (для истории)
     group_id = db.Column(db.Integer, db.ForeignKey('group.id'), nullable=True, index=True)
 
@@ -345,7 +347,8 @@ class SquadScoreLog(db.Model):
     description = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
-    user = db.relationship('User', backref=db.backref('score_logs', lazy='dynamic', cascade='all, delete-orphan'))
+    user = db.relationship('User', backref=db.backref('score_logs', lazy='dynamic', cascade='all, delete-orphan',
+                                                            passive_deletes=True))
     group = db.relationship('Group', backref=db.backref('score_logs', lazy='dynamic'))
 
 # ------------------ DIET / ACTIVITY ------------------
@@ -354,7 +357,7 @@ class MealLog(db.Model):
     __tablename__ = 'meal_logs'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
     date = db.Column(db.Date, nullable=False, default=date.today, index=True)
     meal_type = db.Column(db.String(20), nullable=False)  # 'breakfast','lunch','dinner','snack'
     name = db.Column(db.String(100), nullable=True)
@@ -410,7 +413,7 @@ class Activity(db.Model):
     __tablename__ = "activity"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'))
     date = db.Column(db.Date, default=date.today, index=True)
     steps = db.Column(db.Integer)
     active_kcal = db.Column(db.Integer)
@@ -424,12 +427,15 @@ class Activity(db.Model):
         backref=db.backref("activities", lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     )
 
+    # Стрик активности: WHERE user_id = ? AND date < ? AND steps >= ? — покрывается индексом целиком
+    __table_args__ = (db.Index('ix_activity_user_date_steps', 'user_id', 'date', 'steps'),)
+
 
 class Diet(db.Model):
     __tablename__ = "diet"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
     date = db.Column(db.Date, default=date.today, index=True)
     breakfast = db.Column(db.Text)
     lunch = db.Column(db.Text)
@@ -551,7 +557,7 @@ class BodyAnalysis(db.Model):
     __tablename__ = "body_analysis"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), index=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     height = db.Column(db.Integer)
     weight = db.Column(db.Float)
@@ -576,13 +582,16 @@ class BodyAnalysis(db.Model):
         backref=db.backref('analyses', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     )
 
+    # История замеров: WHERE user_id = ? AND timestamp >= ? — диапазонный скан по B-tree
+    __table_args__ = (db.Index('ix_body_analysis_user_timestamp', 'user_id', 'timestamp'),)
+
 
 # ------------------ SETTINGS / REMINDERS ------------------
 
 class UserSettings(db.Model):
     __tablename__ = "user_settings"
 
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
     telegram_notify_enabled = db.Column(
         db.Boolean, default=True, server_default=expression.true(), nullable=False
     )
@@ -599,14 +608,15 @@ class UserSettings(db.Model):
         db.String(64), default="Asia/Almaty", server_default="Asia/Almaty", nullable=False
     )
 
-    user = db.relationship("User", backref=db.backref("settings", uselist=False))
+    user = db.relationship("User", backref=db.backref("settings", uselist=False,
+                                                      cascade="all, delete-orphan", passive_deletes=True))
 
 
 class MealReminderLog(db.Model):
     __tablename__ = "meal_reminder_log"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), index=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), index=True, nullable=False)
     meal_type = db.Column(db.String(16), nullable=False)  # breakfast|lunch|dinner
     date_sent = db.Column(db.Date, nullable=False, default=date.today, index=True)
 
@@ -620,7 +630,7 @@ class MealReminderLog(db.Model):
 class DietPreference(db.Model):
     __tablename__ = "diet_preference"
 
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
     # При первичной генерации фиксируем долговременные настройки
     sex = db.Column(db.String(16), nullable=True)  # 'male' | 'female' | None
     goal = db.Column(db.String(32), nullable=True)  # 'fat_loss' | 'muscle_gain' | 'recomp' | ...
@@ -632,7 +642,8 @@ class DietPreference(db.Model):
     carbs_max = db.Column(db.Float, nullable=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    user = db.relationship("User", backref=db.backref("diet_preference", uselist=False))
+    user = db.relationship("User", backref=db.backref("diet_preference", uselist=False,
+                                                      cascade="all, delete-orphan", passive_deletes=True))
 
 
 class StagedDiet(db.Model):
@@ -666,6 +677,18 @@ class UploadedFile(db.Model):
     data = db.Column(db.LargeBinary, nullable=False)
     size = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Если задано — байты лежат во внешнем хранилище (см. storage.py), а data пустая
+    storage_url = db.Column(db.String(500), nullable=True)
+
+
+class VisualizationCache(db.Model):
+    """Общий для всех воркеров кэш готовых картинок визуализации: ключ -> имя файла."""
+    __tablename__ = "visualization_cache"
+
+    cache_key = db.Column(db.String(64), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    last_used = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
 
 
 # === Shopping cart (NEW) ===
@@ -703,7 +726,7 @@ class BodyVisualization(db.Model):
     __tablename__ = "body_visualization"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), index=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), index=True, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     # исходные метрики и целевые (для восстановления промптов)
@@ -715,11 +738,21 @@ class BodyVisualization(db.Model):
 
     provider = db.Column(db.String(50), nullable=False, default="gemini")  # 'gemini'
     provider_job_id = db.Column(db.String(100), nullable=True)
-    status = db.Column(db.String(20), nullable=False, default="done")  # 'done'|'error'
+    status = db.Column(db.String(20), nullable=False, default="done")  # 'pending'|'done'|'error'
     error = db.Column(db.Text, nullable=True)
 
+    # Повтор того же запроса (двойной тап, ретрай клиента) находит эту запись вместо новой генерации
+    idempotency_key = db.Column(db.String(64), nullable=True)
+    # sha256 фото-референса: по нему прогревается кэш картинок при старте
+    avatar_hash = db.Column(db.String(64), nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "idempotency_key", name="uq_body_visualization_idempotency"),
+    )
+
     user = db.relationship("User", backref=db.backref("visualizations", lazy=True,
-                                                      order_by="desc(BodyVisualization.created_at)"))
+                                                      order_by="desc(BodyVisualization.created_at)",
+                                                      cascade="all, delete-orphan", passive_deletes=True))
 
 class Achievement(db.Model):
     __tablename__ = 'achievements'
@@ -758,7 +791,7 @@ class Notification(db.Model):
     __tablename__ = 'notifications'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
 
     title = db.Column(db.String(255), nullable=False)
     body = db.Column(db.Text, nullable=True)
@@ -774,6 +807,9 @@ class Notification(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Лента: WHERE user_id = ? [AND id < ?] ORDER BY id DESC LIMIT 50 — keyset-страницы прямо из индекса
+    __table_args__ = (db.Index('ix_notifications_user_id', 'user_id', 'id'),)
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -887,7 +923,9 @@ class SupportTicket(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    messages = db.relationship('SupportMessage', backref='ticket', lazy=True)
+    # Сортирует БД (ORDER BY created_at) — в роутах не нужен sorted() в Python
+    messages = db.relationship('SupportMessage', backref='ticket', lazy=True,
+                               order_by='SupportMessage.created_at')
 
 
 class SupportMessage(db.Model):
@@ -903,12 +941,13 @@ class WeightLog(db.Model):
     __tablename__ = 'weight_logs'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
     weight = db.Column(db.Float, nullable=False)
     date = db.Column(db.Date, default=date.today, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    user = db.relationship('User', backref=db.backref('weight_logs', lazy='dynamic', cascade='all, delete-orphan'))
+    user = db.relationship('User', backref=db.backref('weight_logs', lazy='dynamic', cascade='all, delete-orphan',
+                                                             passive_deletes=True))
 
 
 @event.listens_for(User, "after_insert")
@@ -921,4 +960,23 @@ def create_default_settings(mapper, connection, target):
     """
     connection.execute(
         UserSettings.__table__.insert().values(user_id=target.id)
-    )
\ No newline at end of file
+    )
+
+
+@event.listens_for(BodyAnalysis, "before_insert")
+@event.listens_for(BodyAnalysis, "before_update")
+def fill_body_analysis_bmi(mapper, connection, target):
+    """
+    Замеры пишутся один раз — BMI считаем при записи, а не на каждом чтении истории.
+    Уже заданный BMI (например, с весов) не трогаем, пока не поменялись вес или рост.
+    """
+    stale = False
+    if target.bmi:
+        state = inspect(target)
+        stale = (state.persistent
+                 and not state.attrs.bmi.history.has_changes()
+                 and (state.attrs.weight.history.has_changes()
+                      or state.attrs.height.history.has_changes()))
+    if (not target.bmi or stale) and target.weight and target.height:
+        h_m = target.height / 100.0
+        target.bmi = round(target.weight / (h_m * h_m), 1)
@@ -1,5 +1,10 @@
+import asyncio
+import atexit
 import json
 import logging
+import queue
+import threading
+import time
 from datetime import datetime
 from firebase_admin import messaging
 from extensions import db
@@ -7,6 +12,23 @@ from models import User, Notification
 
 logger = logging.getLogger(__name__)
 
+# Пуши уходят из фонового потока: запрос не ждёт HTTPS-запроса к FCM (~200 мс)
+FCM_BATCH_SIZE = 500          # максимум сообщений в одном send_each
+PUSH_DEBOUNCE_SEC = 0.05      # сколько ждём соседние пуши, чтобы отправить их одной пачкой
+
+# Android-настройки одинаковы для всех пушей — создаём один раз на модуль.
+# high priority нужен data-only сообщениям, чтобы разбудить приложение в Doze
+_ANDROID_CONFIG = messaging.AndroidConfig(priority='high')
+
+_push_queue = queue.SimpleQueue()
+
+# Постоянный event loop для send_each_async: его httpx-клиент держит одно HTTP/2
+# соединение к FCM, и все сообщения пачки идут параллельными потоками в нём
+_fcm_loop = None
+_fcm_loop_lock = threading.Lock()
+_push_worker = None
+_push_worker_lock = threading.Lock()
+
 def send_user_notification(user_id: int, title: str, body: str, type: str = 'info',
                            data: dict = None, route: str = None, route_args: dict = None,
                            # Новые параметры оформления:
@@ -51,33 +73,109 @@ def send_user_notification(user_id: int, title: str, body: str, type: str = 'inf
 
         user = db.session.get(User, user_id)
         if user and user.fcm_device_token:
-            send_fcm_push(user.fcm_device_token, title, body, final_data)
+            enqueue_fcm_push(user.fcm_device_token, title, body, final_data)
 
         return True
     except Exception as e:
         logger.error(f"Error sending notification to user {user_id}: {e}")
         return False
 
-def send_fcm_push(token: str, title: str, body: str, data: dict = None):
-    """Отправка Data-only пуша, чтобы Flutter AwesomeNotifications сам рисовал дизайн"""
-    try:
-        data_dict = data or {}
+def _build_fcm_message(token: str, title: str, body: str, data: dict = None):
+    """Data-only сообщение, чтобы Flutter AwesomeNotifications сам рисовал дизайн"""
+    data_dict = dict(data or {})
 
-        # Обязательно прокидываем системные title и body внутрь data
-        data_dict['title'] = title
-        data_dict['body'] = body
+    # Обязательно прокидываем системные title и body внутрь data
+    data_dict['title'] = title
+    data_dict['body'] = body
 
-        # FCM принимает данные только в формате строк
-        str_data = {k: str(v) for k, v in data_dict.items()}
+    # FCM принимает данные только в формате строк
+    str_data = {k: str(v) for k, v in data_dict.items()}
 
-        # Отправляем сообщение БЕЗ блока notification
-        # Это заставит Android/iOS разбудить Flutter, а не рисовать скучную серую карточку
-        message = messaging.Message(
-            data=str_data,
-            token=token,
-        )
-        response = messaging.send(message)
+    # Отправляем сообщение БЕЗ блока notification
+    # Это заставит Android/iOS разбудить Flutter, а не рисовать скучную серую карточку
+    return messaging.Message(
+        data=str_data,
+        android=_ANDROID_CONFIG,
+        token=token,
+    )
+
+
+def send_fcm_push(token: str, title: str, body: str, data: dict = None):
+    """Синхронная отправка одного Data-only пуша"""
+    try:
+        messaging.send(_build_fcm_message(token, title, body, data))
         return True
     except Exception as e:
         logger.error(f"FCM error: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+def _get_fcm_loop():
+    global _fcm_loop
+    if _fcm_loop is None:
+        with _fcm_loop_lock:
+            if _fcm_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="fcm-http2", daemon=True).start()
+                _fcm_loop = loop
+    return _fcm_loop
+
+
+def send_each_http2(messages):
+    """messaging.send_each поверх HTTP/2: пачка уходит по одному мультиплексированному соединению."""
+    future = asyncio.run_coroutine_threadsafe(messaging.send_each_async(messages), _get_fcm_loop())
+    return future.result()
+
+
+def _send_fcm_batch(messages):
+    """Отправляет накопленные сообщения пачками по FCM_BATCH_SIZE через send_each."""
+    for i in range(0, len(messages), FCM_BATCH_SIZE):
+        try:
+            batch = send_each_http2(messages[i:i + FCM_BATCH_SIZE])
+        except Exception as e:
+            logger.error(f"FCM batch error: {e}")
+            continue
+        for resp in batch.responses:
+            if not resp.success:
+                logger.error(f"FCM error: {resp.exception}")
+
+
+def _drain(first=None):
+    """Забирает из очереди всё, что уже накопилось (не блокируясь)."""
+    messages = [first] if first is not None else []
+    while True:
+        try:
+            messages.append(_push_queue.get_nowait())
+        except queue.Empty:
+            return messages
+
+
+def _push_worker_loop():
+    while True:
+        first = _push_queue.get()
+        # Короткая пауза, чтобы пуши из одного цикла рассылки ушли одним send_each
+        time.sleep(PUSH_DEBOUNCE_SEC)
+        _send_fcm_batch(_drain(first))
+
+
+def _flush_on_exit():
+    """При остановке процесса досылаем то, что не успел забрать поток."""
+    messages = _drain()
+    if messages:
+        _send_fcm_batch(messages)
+
+
+def _ensure_push_worker():
+    global _push_worker
+    if _push_worker is None:
+        with _push_worker_lock:
+            if _push_worker is None:
+                _push_worker = threading.Thread(target=_push_worker_loop, name="fcm-push", daemon=True)
+                _push_worker.start()
+                atexit.register(_flush_on_exit)
+
+
+def enqueue_fcm_push(token: str, title: str, body: str, data: dict = None):
+    """Ставит Data-only пуш в очередь фоновой отправки и сразу возвращает управление"""
+    _ensure_push_worker()
+    _push_queue.put(_build_fcm_message(token, title, body, data))
@@ -0,0 +1,56 @@
+# storage.py
+"""
+Хранилище бинарных файлов вне БД.
+
+Если задан GCS_BUCKET_NAME — файлы уходят в Google Cloud Storage,
+иначе пишутся в локальную папку uploads (её же отдаёт serve_file).
+В UploadedFile остаётся только ссылка (storage_url) и метаданные.
+"""
+import os
+import threading
+
+GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "uploads")
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    """Лениво создаёт клиента GCS (у него внутри пул keep-alive соединений)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google.cloud import storage as gcs
+                _client = gcs.Client()
+    return _client
+
+
+def put_file(raw_bytes: bytes, key: str, content_type: str) -> str:
+    """Сохраняет байты и возвращает storage_url для записи в UploadedFile."""
+    if GCS_BUCKET_NAME:
+        blob = _get_client().bucket(GCS_BUCKET_NAME).blob(key)
+        blob.upload_from_string(raw_bytes, content_type=content_type)
+        return f"gs://{GCS_BUCKET_NAME}/{key}"
+
+    # Локально кладём по имени файла — serve_file найдёт его на диске без обращения к БД
+    os.makedirs(LOCAL_STORAGE_DIR, exist_ok=True)
+    path = os.path.join(LOCAL_STORAGE_DIR, os.path.basename(key))
+    with open(path, "wb") as f:
+        f.write(raw_bytes)
+    return path
+
+
+def read_file(uploaded_file) -> bytes:
+    """Возвращает содержимое UploadedFile независимо от того, где лежат байты."""
+    url = getattr(uploaded_file, "storage_url", None)
+    if not url:
+        return uploaded_file.data
+
+    if url.startswith("gs://"):
+        bucket_name, key = url[len("gs://"):].split("/", 1)
+        return _get_client().bucket(bucket_name).blob(key).download_as_bytes()
+
+    with open(url, "rb") as f:
+        return f.read()
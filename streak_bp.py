@@ -1,174 +1,338 @@
-import threading
-import time
-import os
+import fcntl
 from datetime import date, datetime, timedelta
+from itertools import groupby
+from apscheduler.schedulers.background import BackgroundScheduler
 from flask import Blueprint
-from sqlalchemy import func
+from sqlalchemy import func, insert, lambda_stmt, or_, select
 from extensions import db
-from models import User, MealLog, Activity
+from models import User, UserSettings, MealLog, Activity, Notification
+from notification_service import send_each_http2
 from firebase_admin import messaging
 import firebase_admin
 
 streak_bp = Blueprint('streak_bp', __name__)
 
-def recalculate_streak(user):
+ONE_DAY = timedelta(days=1)
+
+# Сколько строк пользователей читать/писать за один раз в фоновых задачах
+STREAK_BATCH_SIZE = 500
+
+
+def _user_streaks(user_id, step_goal=10000, daily_limit=2000, *, today=None, yesterday=None):
     """
-    Рассчитывает стрик ТОЛЬКО по ЗАВЕРШЕННЫМ дням (до вчерашнего включительно).
+    Стрики (питание, активность, общий) ТОЛЬКО по ЗАВЕРШЕННЫМ дням (до вчерашнего включительно).
+    Работает по id и цели шагов, без ORM-объекта User.
+    В циклах по пользователям передавайте today/yesterday, посчитанные один раз на запуск.
     """
-    today = date.today()
-    yesterday = today - timedelta(days=1)
+    today = today or date.today()
+    yesterday = yesterday or today - ONE_DAY
 
     # --- 1. Питание (Дефицит) ---
-    daily_limit = getattr(user, 'daily_calories', 2000) or 2000
-
-    # Берем только дни СТРОГО ДО СЕГОДНЯ (< today)
-    meal_rows = db.session.query(MealLog.date) \
-        .filter(MealLog.user_id == user.id) \
-        .filter(MealLog.date < today) \
-        .group_by(MealLog.date) \
-        .having(func.sum(MealLog.calories) > 0) \
-        .having(func.sum(MealLog.calories) <= daily_limit) \
-        .order_by(MealLog.date.desc()) \
-        .all()
-
-    meal_dates = {row.date for row in meal_rows}
+    daily_limit = int(daily_limit or 2000)
+
+    # Берем только дни СТРОГО ДО СЕГОДНЯ (< today).
+    # lambda_stmt: SQL компилируется один раз, дальше меняются только параметры —
+    # в полночь функция вызывается для каждого пользователя
+    meal_dates = db.session.execute(lambda_stmt(
+        lambda: select(MealLog.date)
+        .where(MealLog.user_id == user_id, MealLog.date < today)
+        .group_by(MealLog.date)
+        .having(func.sum(MealLog.calories) > 0)
+        .having(func.sum(MealLog.calories) <= daily_limit)
+        .order_by(MealLog.date.desc())
+    )).scalars().all()
 
     # --- 2. Активность (Шаги) ---
-    step_goal = getattr(user, 'step_goal', 10000) or 10000
+    step_goal = int(step_goal or 10000)
 
     # Тоже строго до сегодня
-    activity_rows = db.session.query(Activity.date) \
-        .filter(Activity.user_id == user.id) \
-        .filter(Activity.steps >= step_goal) \
-        .filter(Activity.date < today) \
-        .order_by(Activity.date.desc()) \
-        .all()
-
-    activity_dates = {row.date for row in activity_rows}
+    activity_dates = db.session.execute(lambda_stmt(
+        lambda: select(Activity.date).distinct()
+        .where(Activity.user_id == user_id, Activity.steps >= step_goal, Activity.date < today)
+        .order_by(Activity.date.desc())
+    )).scalars().all()
 
-    # --- 3. Общий (Пересечение) ---
-    total_dates = meal_dates.intersection(activity_dates)
+    # --- 3. Общий (Пересечение), порядок по убыванию сохраняется ---
+    activity_set = set(activity_dates)
+    total_dates = [d for d in meal_dates if d in activity_set]
 
     # --- Внутренняя функция подсчета ---
-    def calc_streak_from_dates(dates_set):
-        if not dates_set:
-            return 0
-        # Превращаем в сортированный список
-        sorted_dates = sorted(list(dates_set), reverse=True)
+    def calc_streak_from_dates(dates_desc):
+        # Даты уже отсортированы SQL по убыванию: идём от вчера назад до первого пропуска.
+        # Если последняя успешная дата была ПОЗАВЧЕРА (или раньше) — первая же не совпадёт, стрик 0
+        streak = 0
+        check = yesterday
+        for d in dates_desc:
+            if d != check:
+                break
+            streak += 1
+            check -= ONE_DAY
+        return streak
 
-        # Если последняя успешная дата была ПОЗАВЧЕРА (или раньше), значит ВЧЕРА пропущено -> стрик 0
-        last_success = sorted_dates[0]
+    return (calc_streak_from_dates(meal_dates),
+            calc_streak_from_dates(activity_dates),
+            calc_streak_from_dates(total_dates))
 
-        if last_success < yesterday:
-            return 0
 
-        # Считаем серию
-        streak = 0
-        check = yesterday  # Начинаем проверку со вчерашнего дня
+def recalculate_streak(user, *, today=None, yesterday=None):
+    """
+    Рассчитывает стрик ТОЛЬКО по ЗАВЕРШЕННЫМ дням (до вчерашнего включительно).
+    """
+    user.streak_nutrition, user.streak_activity, user.current_streak = _user_streaks(
+        user.id,
+        getattr(user, 'step_goal', 10000),
+        getattr(user, 'daily_calories', 2000),
+        today=today,
+        yesterday=yesterday,
+    )
 
-        for d in sorted_dates:
-            if d == check:
-                streak += 1
-                check -= timedelta(days=1)
-            else:
+
+def _streaks_by_user(rows, yesterday):
+    """
+    Длина серии подряд идущих дней, заканчивающейся вчера, для каждого пользователя.
+    rows — пары (user_id, date), отсортированные по user_id и по дате по убыванию.
+    """
+    streaks = {}
+    for user_id, days in groupby(rows, key=lambda r: r[0]):
+        streak = 0
+        check = yesterday
+        for _, d in days:
+            if d != check:
                 break
-        return streak
+            streak += 1
+            check -= ONE_DAY
+        if streak:
+            streaks[user_id] = streak
+    return streaks
 
-    user.streak_nutrition = calc_streak_from_dates(meal_dates)
-    user.streak_activity = calc_streak_from_dates(activity_dates)
-    user.current_streak = calc_streak_from_dates(total_dates)
 
-def _send_push(token, title, body):
-    if not token or not firebase_admin._apps:
-        return
-    try:
-        msg = messaging.Message(
-            notification=messaging.Notification(title=title, body=body),
-            token=token
+def recalculate_all_streaks():
+    """
+    Пересчитывает стрики ВСЕМ пользователям (та же логика, что в recalculate_streak).
+    Два агрегирующих запроса на всю базу вместо двух на каждого пользователя,
+    изменившиеся значения пишутся одним bulk UPDATE. Возвращает число обновлённых.
+    """
+    today = date.today()
+    yesterday = today - ONE_DAY
+
+    # --- 1. Питание: дни с дефицитом (у User нет daily_calories -> лимит 2000) ---
+    meal_rows = db.session.execute(
+        select(MealLog.user_id, MealLog.date)
+        .where(MealLog.date < today)
+        .group_by(MealLog.user_id, MealLog.date)
+        .having(func.sum(MealLog.calories) > 0)
+        .having(func.sum(MealLog.calories) <= 2000)
+        .order_by(MealLog.user_id, MealLog.date.desc())
+    )
+    nutrition = _streaks_by_user(meal_rows, yesterday)
+
+    # --- 2. Активность: дни, где шаги >= цели пользователя ---
+    step_goal = func.coalesce(func.nullif(User.step_goal, 0), 10000)
+    activity_rows = db.session.execute(
+        select(Activity.user_id, Activity.date)
+        .join(User, User.id == Activity.user_id)
+        .where(Activity.date < today, Activity.steps >= step_goal)
+        .distinct()
+        .order_by(Activity.user_id, Activity.date.desc())
+    )
+    activity = _streaks_by_user(activity_rows, yesterday)
+
+    # --- 3. Общий: обе серии идут от вчерашнего дня, пересечение = меньшая из них ---
+    # Пользователей читаем потоком (только нужные колонки), изменения пишем пачками
+    updated = 0
+    mappings = []
+    current = db.session.execute(
+        select(User.id, User.streak_nutrition, User.streak_activity, User.current_streak)
+        .execution_options(yield_per=STREAK_BATCH_SIZE)
+    )
+    for user_id, old_nutrition, old_activity, old_total in current:
+        n = nutrition.get(user_id, 0)
+        a = activity.get(user_id, 0)
+        t = min(n, a)
+        if (old_nutrition, old_activity, old_total) != (n, a, t):
+            mappings.append({
+                "id": user_id,
+                "streak_nutrition": n,
+                "streak_activity": a,
+                "current_streak": t,
+            })
+        if len(mappings) >= STREAK_BATCH_SIZE:
+            db.session.bulk_update_mappings(User, mappings)
+            updated += len(mappings)
+            mappings = []
+
+    if mappings:
+        db.session.bulk_update_mappings(User, mappings)
+        updated += len(mappings)
+    return updated
+
+
+# FCM принимает не больше 500 сообщений за один send_each
+FCM_BATCH_SIZE = 500
+
+# Общие для всех предупреждений части сообщения собираем один раз, а не на каждый пуш.
+# TTL час: предупреждение о стрике после полуночи уже бессмысленно
+_STREAK_ANDROID = messaging.AndroidConfig(priority='high', ttl=timedelta(hours=1))
+
+
+def _send_push_batch(pushes):
+    """
+    Отправляет пачку пушей [(user_id, token, title, body), ...] через send_each по HTTP/2
+    (до 500 сообщений в одном соединении вместо запроса на каждого пользователя).
+    Возвращает число доставленных; токены удалённых приложений очищает.
+    """
+    if not pushes or not firebase_admin._apps:
+        return 0
+
+    sent = 0
+    stale_user_ids = []
+    for i in range(0, len(pushes), FCM_BATCH_SIZE):
+        chunk = pushes[i:i + FCM_BATCH_SIZE]
+        messages = [
+            messaging.Message(notification=messaging.Notification(title=title, body=body),
+                              android=_STREAK_ANDROID, token=token)
+            for _, token, title, body in chunk
+        ]
+        try:
+            batch = send_each_http2(messages)
+        except Exception as e:
+            print(f"[Streak] Push batch error: {e}")
+            continue
+        sent += batch.success_count
+        for (user_id, _, _, _), resp in zip(chunk, batch.responses):
+            if not resp.success:
+                if isinstance(resp.exception, messaging.UnregisteredError):
+                    stale_user_ids.append(user_id)
+                else:
+                    print(f"[Streak] Push error for user {user_id}: {resp.exception}")
+
+    if stale_user_ids:
+        User.query.filter(User.id.in_(stale_user_ids)).update(
+            {User.fcm_device_token: None}, synchronize_session=False)
+    return sent
+
+
+def evening_check(app):
+    """
+    18:00 — напоминает, если пользователь забыл поесть,
+    а вчерашний стрик ещё можно сохранить.
+    """
+    with app.app_context():
+        print("[Streak] Запуск вечерней проверки...")
+        today = date.today()
+        yesterday = today - ONE_DAY
+
+        # Кто ел сегодня/вчера — одним запросом на всех вместо двух проверок на пользователя
+        meal_days = set(db.session.execute(
+            select(MealLog.user_id, MealLog.date)
+            .where(MealLog.date.in_((yesterday, today)))
+            .distinct()
+        ).tuples())
+
+        # Потоком и только нужные колонки: без загрузки всех User и ленивых u.settings
+        rows = db.session.execute(
+            select(User.id, User.fcm_device_token, User.step_goal)
+            .outerjoin(UserSettings, UserSettings.user_id == User.id)
+            .where(
+                User.fcm_device_token.isnot(None),
+                or_(UserSettings.user_id.is_(None), UserSettings.notify_meals.is_(True)),
+            )
+            .execution_options(yield_per=STREAK_BATCH_SIZE)
         )
-        messaging.send(msg)
-    except Exception as e:
-        print(f"[Streak] Push error: {e}")
 
-
-def _streak_checker_worker(app):
+        pushes = []
+        mappings = []
+        for user_id, token, step_goal in rows:
+            # Если сегодня уже что-то записал - не трогаем
+            if (user_id, today) in meal_days:
+                continue
+
+            # Проверяем, есть ли запись за вчера (как индикатор активности)
+            if (user_id, yesterday) in meal_days:
+                # Важно: пересчитываем, чтобы убедиться, что стрик не 0
+                nutrition, activity, total = _user_streaks(user_id, step_goal,
+                                                           today=today, yesterday=yesterday)
+                mappings.append({
+                    "id": user_id,
+                    "streak_nutrition": nutrition,
+                    "streak_activity": activity,
+                    "current_streak": total,
+                })
+                if total > 0:
+                    msg = f"Вы не отметили еду сегодня! Ваш стрик из {total} дней сгорит в полночь 🔥"
+                    pushes.append((user_id, token, "😱 Стрик под угрозой!", msg))
+
+            if len(mappings) >= STREAK_BATCH_SIZE:
+                db.session.bulk_update_mappings(User, mappings)
+                mappings = []
+
+        if mappings:
+            db.session.bulk_update_mappings(User, mappings)
+
+        count = _send_push_batch(pushes)
+
+        # Предупреждения попадают и в ленту уведомлений (как у send_user_notification) —
+        # одним executemany INSERT вместо add()+commit() на каждого
+        if pushes:
+            now = datetime.utcnow()
+            db.session.execute(insert(Notification), [
+                {"user_id": user_id, "title": title, "body": body, "type": "warning",
+                 "is_read": False, "created_at": now}
+                for user_id, _, title, body in pushes
+            ])
+
+        # Коммитим после рассылки (пересчёт стриков, уведомления и очистка мёртвых токенов)
+        db.session.commit()
+        print(f"[Streak] Отправлено {count} предупреждений.")
+
+
+def midnight_rollup(app):
     """
-    Фоновый процесс.
-    1. В 18:00 напоминает, если пользователь забыл поесть.
-    2. В 00:00 (Полночь) пересчитывает стрики всем пользователям.
-       Если вчера план не выполнен — стрик обнулится автоматически.
+    00:00 — финализация дня: пересчитывает стрики всем пользователям.
+    Если вчера план не выполнен — стрик обнулится автоматически.
     """
     with app.app_context():
-        while True:
-            now = datetime.now()
-
-            # --- 1. ВЕЧЕРНЯЯ ПРОВЕРКА (18:00) ---
-            if now.hour == 18 and 0 <= now.minute < 5:
-                print("[Streak] Запуск вечерней проверки...")
-                today = date.today()
-
-                users = User.query.filter(User.fcm_device_token.isnot(None)).all()
-
-                count = 0
-                for u in users:
-                    settings = getattr(u, 'settings', None)
-                    if settings and not settings.notify_meals:
-                        continue
-
-                    # Если сегодня уже что-то записал - не трогаем
-                    has_meal_today = db.session.query(MealLog.id).filter_by(
-                        user_id=u.id,
-                        date=today
-                    ).first() is not None
-
-                    if has_meal_today:
-                        continue
-
-                        # Проверяем, есть ли запись за вчера (как индикатор активности)
-                    yesterday = today - timedelta(days=1)
-                    has_meal_yesterday = db.session.query(MealLog.id).filter_by(
-                        user_id=u.id,
-                        date=yesterday
-                    ).first() is not None
-
-                    if has_meal_yesterday:
-                        # Важно: пересчитываем, чтобы убедиться, что стрик не 0
-                        recalculate_streak(u)
-                        if u.current_streak > 0:
-                            msg = f"Вы не отметили еду сегодня! Ваш стрик из {u.current_streak} дней сгорит в полночь 🔥"
-                            _send_push(u.fcm_device_token, "😱 Стрик под угрозой!", msg)
-                            count += 1
-
-                # Коммитим после рассылки (если были изменения в пересчете)
-                db.session.commit()
-                print(f"[Streak] Отправлено {count} предупреждений.")
-                time.sleep(60 * 10)
-
-                # --- 2. ПОЛНОЧНЫЙ СБРОС (00:00) ---
-            elif now.hour == 0 and 0 <= now.minute < 5:
-                print("[Streak] Полночь. Финализация дня и обновление стриков...")
-
-                # Берем ВСЕХ пользователей, чтобы обновить статистику
-                all_users = User.query.all()
-
-                for u in all_users:
-                    # Функция recalculate_streak смотрит на дни < today.
-                    # В 00:00 "today" стало новым днем.
-                    # Значит, "вчера" (которое только что закончилось) теперь проверяется на выполнение.
-                    # Если вчера не было дефицита/активности -> стрик станет 0.
-                    # Если вчера все ок -> стрик увеличится на +1.
-                    recalculate_streak(u)
-
-                db.session.commit()
-                print(f"[Streak] Стрики обновлены для {len(all_users)} пользователей.")
-
-                # Спим 10 минут, чтобы не запустить повторно в этот же час
-                time.sleep(60 * 10)
-
-            time.sleep(60)
+        print("[Streak] Полночь. Финализация дня и обновление стриков...")
+
+        # Стрики смотрят на дни < today. В 00:00 "today" стало новым днём,
+        # значит "вчера" (которое только что закончилось) теперь проверяется на выполнение:
+        # если вчера не было дефицита/активности -> стрик станет 0, иначе +1.
+        updated = recalculate_all_streaks()
+
+        db.session.commit()
+        print(f"[Streak] Стрики обновлены для {updated} пользователей.")
+
+
+_scheduler = None
 
 
 def start_streak_scheduler(app):
-    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
-        t = threading.Thread(target=_streak_checker_worker, args=(app,), daemon=True)
-        t.start()
\ No newline at end of file
+    """
+    Запускает cron-задачи стриков (18:00 и 00:00) в фоновом APScheduler. Вернуть инстанс.
+    Файловая блокировка гарантирует, что задачи крутит только ОДИН процесс (как у training_notifier).
+    """
+    global _scheduler
+    if _scheduler:
+        return _scheduler
+
+    try:
+        lock_file = open("streak_scheduler.lock", "w")
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        # Файл уже заблокирован другим воркером — задачи стриков крутятся там
+        return None
+
+    # coalesce: пропущенные за время простоя запуски выполняются один раз, а не пачкой
+    _scheduler = BackgroundScheduler(timezone="Asia/Almaty", daemon=True,
+                                     job_defaults={"coalesce": True, "max_instances": 1,
+                                                   "misfire_grace_time": 600})
+    _scheduler.add_job(evening_check, "cron", hour=18, minute=0, args=[app],
+                       id="streak-evening", replace_existing=True)
+    _scheduler.add_job(midnight_rollup, "cron", hour=0, minute=0, args=[app],
+                       id="streak-midnight", replace_existing=True)
+    _scheduler.start()
+
+    # Держим файл открытым, иначе блокировка спадёт
+    app.streak_scheduler_lock_file = lock_file
+    print("[Streak] BackgroundScheduler started (Server Timezone: Asia/Almaty).")
+    return _scheduler
@@ -5,10 +5,13 @@ import os
 from werkzeug.utils import secure_filename
 import uuid
 from datetime import datetime
+from sqlalchemy import func, insert, update
 
 support_bp = Blueprint('support', __name__)
 
 UPLOAD_FOLDER = 'static/support_uploads'
+# Вложения копируем на диск блоками по 1 МБ (по умолчанию werkzeug пишет по 16 КБ)
+UPLOAD_BUFFER_SIZE = 1 << 20
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
@@ -28,10 +31,8 @@ def get_active_ticket():
 
     # Собираем сообщения
     messages = []
-    # Сортируем сообщения по дате
-    sorted_msgs = sorted(ticket.messages, key=lambda x: x.created_at)
-
-    for msg in sorted_msgs:
+    # Сообщения уже отсортированы по дате (order_by в relationship)
+    for msg in ticket.messages:
         messages.append({
             'id': msg.id,
             'sender': msg.sender_type,
@@ -51,32 +52,38 @@ def get_active_ticket():
 @token_required
 def send_message():
     user = g.user
-    ticket_id = request.form.get('ticket_id')
+    ticket_id = request.form.get('ticket_id', type=int)
     text = request.form.get('text')
     image = request.files.get('image')
 
-    ticket = SupportTicket.query.filter_by(id=ticket_id, user_id=user.id).first()
-    if not ticket or ticket.status != 'open':
+    # Одним UPDATE и проверяем, что тикет открыт и принадлежит юзеру, и двигаем updated_at
+    # (без SELECT тикета в сессию и ORM-flush)
+    touched = db.session.execute(
+        update(SupportTicket)
+        .where(SupportTicket.id == ticket_id,
+               SupportTicket.user_id == user.id,
+               SupportTicket.status == 'open')
+        .values(updated_at=datetime.utcnow())
+    ).rowcount
+    if not touched:
+        db.session.rollback()
         return jsonify({'error': 'Active ticket not found'}), 404
 
     image_url = None
     if image:
         filename = secure_filename(f"{uuid.uuid4()}_{image.filename}")
         path = os.path.join(UPLOAD_FOLDER, filename)
-        image.save(path)
+        image.save(path, buffer_size=UPLOAD_BUFFER_SIZE)
         # URL относительно корня сервера
         image_url = f"/static/support_uploads/{filename}"
 
-    new_msg = SupportMessage(
-        ticket_id=ticket.id,
+    db.session.execute(insert(SupportMessage).values(
+        ticket_id=ticket_id,
         sender_type='user',
         text=text,
-        image_url=image_url
-    )
-
-    ticket.updated_at = datetime.utcnow()
-
-    db.session.add(new_msg)
+        image_url=image_url,
+        created_at=datetime.utcnow()
+    ))
     db.session.commit()
 
     return jsonify({'status': 'sent', 'image_url': image_url}), 200
@@ -86,14 +93,29 @@ def send_message():
 @token_required
 def get_history():
     user = g.user
-    tickets = SupportTicket.query.filter_by(user_id=user.id, status='closed').order_by(
-        SupportTicket.created_at.desc()).all()
+    # Последнее сообщение каждого тикета — оконной функцией, одним запросом вместо запроса на тикет;
+    # окно считаем только по закрытым тикетам юзера, а не по всей таблице сообщений
+    last_msgs = db.session.query(
+        SupportMessage.ticket_id,
+        SupportMessage.text,
+        SupportMessage.image_url,
+        func.row_number().over(
+            partition_by=SupportMessage.ticket_id,
+            order_by=(SupportMessage.created_at.desc(), SupportMessage.id.desc())
+        ).label('rn')
+    ).join(SupportTicket, SupportTicket.id == SupportMessage.ticket_id) \
+        .filter(SupportTicket.user_id == user.id, SupportTicket.status == 'closed') \
+        .subquery()
+
+    rows = db.session.query(SupportTicket, last_msgs.c.text, last_msgs.c.image_url) \
+        .outerjoin(last_msgs, (last_msgs.c.ticket_id == SupportTicket.id) & (last_msgs.c.rn == 1)) \
+        .filter(SupportTicket.user_id == user.id, SupportTicket.status == 'closed') \
+        .order_by(SupportTicket.created_at.desc()) \
+        .all()
 
     result = []
-    for t in tickets:
-        last_msg = SupportMessage.query.filter_by(ticket_id=t.id).order_by(SupportMessage.created_at.desc()).first()
-        preview = last_msg.text if last_msg and last_msg.text else (
-            "Image" if last_msg and last_msg.image_url else "No messages")
+    for t, last_text, last_image_url in rows:
+        preview = last_text if last_text else ("Image" if last_image_url else "No messages")
 
         result.append({
             'id': t.id,
@@ -115,8 +137,7 @@ def get_ticket_details(ticket_id):
         return jsonify({'error': 'Ticket not found'}), 404
 
     messages = []
-    sorted_msgs = sorted(ticket.messages, key=lambda x: x.created_at)
-    for msg in sorted_msgs:
+    for msg in ticket.messages:
         messages.append({
             'id': msg.id,
             'sender': msg.sender_type,
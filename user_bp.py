@@ -1,21 +1,77 @@
-from flask import Blueprint, jsonify, request, session
-from sqlalchemy import func, cast, Date
-from datetime import datetime, timedelta
-from extensions import db
-from models import User, Notification, MealLog, Activity, BodyAnalysis, Diet, Subscription, TrainingSignup
+import itertools
+import json
+import threading
+from cachetools import TTLCache
+from flask import Blueprint, g, jsonify, request, session
+from sqlalchemy import func, cast, Date, event, literal, select, union_all
+from sqlalchemy.orm import Session
+from datetime import date, datetime, time, timedelta
+from flask_limiter.util import get_remote_address
+from extensions import db, limiter
+from models import (User, Notification, MealLog, Activity, BodyAnalysis, Diet, Subscription, TrainingSignup,
+                    WeightLog, SquadScoreLog, MealReminderLog, UserSettings, DietPreference, BodyVisualization)
 from notification_service import send_user_notification
 
 user_bp = Blueprint('user_bp', __name__)
 
 
+# Готовая история дефицита: user_id -> (день, версия данных, history).
+# Версия — count/max(id) еды, активности и замеров юзера одним дешёвым запросом: запись из другого
+# воркера меняет её, и кэш не отдаёт устаревшую историю. Правки в этом процессе сбрасывают кэш после коммита
+_DEFICIT_CACHE = TTLCache(maxsize=5_000, ttl=60)
+_DEFICIT_CACHE_LOCK = threading.Lock()
+_DEFICIT_MODELS = (MealLog, Activity, BodyAnalysis)
+
+
+def _deficit_version(user):
+    """Отпечаток данных, из которых считается история дефицита (1 запрос по индексам user_id)."""
+    counts = union_all(*(
+        select(literal(model.__tablename__), func.count(model.id), func.max(model.id))
+        .where(model.user_id == user.id)
+        for model in _DEFICIT_MODELS
+    ))
+    return user.height, tuple(sorted(tuple(row) for row in db.session.execute(counts)))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_deficit_writes(session, flush_context):
+    # Во время flush транзакция ещё не закоммичена — только запоминаем, чей кэш сбросить
+    touched = session.info.setdefault('deficit_users', set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, _DEFICIT_MODELS):
+            touched.add(obj.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_deficit_history(session):
+    touched = session.info.pop('deficit_users', None)
+    if touched:
+        with _DEFICIT_CACHE_LOCK:
+            for user_id in touched:
+                _DEFICIT_CACHE.pop(user_id, None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_deficit_writes(session):
+    session.info.pop('deficit_users', None)
+
+
 def _current_user():
-    uid = session.get("user_id")
-    return db.session.get(User, uid) if uid else None
+    """Пользователь из сессии; в пределах одного запроса запоминается в g."""
+    if "session_user" not in g:
+        uid = session.get("user_id")
+        g.session_user = db.session.get(User, uid) if uid else None
+    return g.session_user
 
 
-# --- ИСТОРИЯ ДЕФИЦИТА И ЗАМЕРОВ (НОВОЕ) ---
+def _conditional_json(payload):
+    """JSON-ответ с ETag по содержимому: если у клиента та же версия — 304 без тела."""
+    resp = jsonify(payload)
+    resp.add_etag()
+    return resp.make_conditional(request)
 
-from collections import defaultdict
+
+# --- ИСТОРИЯ ДЕФИЦИТА И ЗАМЕРОВ (НОВОЕ) ---
 
 
 @user_bp.route('/api/history/deficit', methods=['GET'])
@@ -24,57 +80,68 @@ def get_deficit_history():
     if not user:
         return jsonify([]), 401
 
+    today = date.today()
+    version = _deficit_version(user)
+    with _DEFICIT_CACHE_LOCK:
+        cached = _DEFICIT_CACHE.get(user.id)
+    if cached and cached[:2] == (today, version):
+        return _conditional_json(cached[2])
+
     history = []
-    today = datetime.now().date()
     start_date = today - timedelta(days=29)  # Последние 30 дней включая сегодня
 
-    profile_height = None
-    bmr = 1600
-    if hasattr(user, 'profile') and user.profile:
-        profile_height = user.profile.get('height')
-        bmr = user.profile.get('metabolism', 1600)
-
-    # 1. Запрашиваем всю еду за 30 дней (1 запрос)
-    meals = MealLog.query.filter(
-        MealLog.user_id == user.id,
-        func.date(MealLog.created_at) >= start_date
-    ).all()
-
-    meals_by_date = defaultdict(int)
-    for m in meals:
-        meals_by_date[m.created_at.date()] += m.calories
-
-    # 2. Запрашиваем всю активность за 30 дней (1 запрос)
-    activities = Activity.query.filter(
-        Activity.user_id == user.id,
-        func.date(Activity.created_at) >= start_date
-    ).all()
-
-    activities_by_date = defaultdict(int)
-    for a in activities:
-        activities_by_date[
-            a.created_at.date()] += a.burned_kcal  # Убедитесь, что поле называется burned_kcal или active_kcal
-
-    # 3. Запрашиваем все замеры за 30 дней (1 запрос)
-    analyses = BodyAnalysis.query.filter(
+    # Плоские значения считаем один раз до цикла по дням (JSON-профиля у User нет):
+    # рост — колонка User.height, BMR — последний известный metabolism из замеров (как в app.py)
+    profile_height = user.height
+    bmr = db.session.query(BodyAnalysis.metabolism).filter(
         BodyAnalysis.user_id == user.id,
-        func.date(BodyAnalysis.timestamp) >= start_date
-    ).order_by(BodyAnalysis.timestamp.desc()).all()
+        BodyAnalysis.metabolism > 0
+    ).order_by(BodyAnalysis.timestamp.desc()).limit(1).scalar() or 1600
+
+    # 1-2. Калории еды и активные калории по дням — суммирует сама БД,
+    # обе выборки одним UNION ALL (1 запрос), строки помечены источником
+    daily_kcal = union_all(
+        select(literal('meal').label('src'), MealLog.date, func.sum(MealLog.calories))
+        .where(MealLog.user_id == user.id, MealLog.date >= start_date)
+        .group_by(MealLog.date),
+        select(literal('activity'), Activity.date, func.sum(Activity.active_kcal))
+        .where(Activity.user_id == user.id, Activity.date >= start_date)
+        .group_by(Activity.date),
+    )
+    meals_by_date, activities_by_date = {}, {}
+    for src, day, kcal in db.session.execute(daily_kcal):
+        (meals_by_date if src == 'meal' else activities_by_date)[day] = kcal
+
+    # 3. Самый последний замер за каждый день — отбирает БД оконной функцией (1 запрос)
+    ranked = db.session.query(
+        BodyAnalysis.timestamp,
+        BodyAnalysis.weight,
+        BodyAnalysis.fat_mass,
+        BodyAnalysis.bmi,
+        BodyAnalysis.height,
+        func.row_number().over(
+            partition_by=func.date(BodyAnalysis.timestamp),
+            order_by=BodyAnalysis.timestamp.desc()
+        ).label('rn')
+    ).filter(
+        BodyAnalysis.user_id == user.id,
+        # Полуоткрытый диапазон по самой колонке (не func.date(...)) — работает индекс (user_id, timestamp)
+        BodyAnalysis.timestamp >= datetime.combine(start_date, time.min)
+    ).subquery()
 
-    # Оставляем только самый последний замер для каждого дня
-    analysis_by_date = {}
-    for a in analyses:
-        date_key = a.timestamp.date()
-        if date_key not in analysis_by_date:
-            analysis_by_date[date_key] = a
+    analysis_by_date = {
+        a.timestamp.date(): a
+        for a in db.session.query(ranked).filter(ranked.c.rn == 1)
+    }
 
     # Собираем данные в цикле (БЕЗ запросов к БД)
     for i in range(30):
         current_date = today - timedelta(days=i)
 
-        consumed = meals_by_date.get(current_date, 0)
-        active_burned = activities_by_date.get(current_date, 0)
-        total_burned = int(bmr + active_burned)
+        consumed = meals_by_date.get(current_date) or 0
+        active_burned = activities_by_date.get(current_date) or 0
+        # Колонки Integer, SUM() в SQL тоже целый — приводить к int не нужно
+        total_burned = bmr + active_burned
 
         analysis = analysis_by_date.get(current_date)
         weight_val = bmi_val = fat_val = None
@@ -84,20 +151,18 @@ def get_deficit_history():
             fat_val = analysis.fat_mass
             bmi_val = analysis.bmi
 
-            if not bmi_val and weight_val:
-                h_val = analysis.height or profile_height
-                if h_val:
-                    try:
-                        h_m = h_val / 100.0
-                        bmi_val = round(weight_val / (h_m * h_m), 1)
-                    except:
-                        pass
+            # BMI заполняется при записи замера (см. models.fill_body_analysis_bmi);
+            # досчитываем только для старых записей, сохранённых до этого
+            h_val = analysis.height or profile_height
+            if not bmi_val and weight_val and h_val:
+                h_m = h_val / 100.0
+                bmi_val = round(weight_val / (h_m * h_m), 1)
 
         day_data = {
-            "date": current_date.strftime("%d.%m.%Y"),
-            "consumed": int(consumed),
-            "total_burned": int(total_burned),
-            "deficit": int(total_burned - consumed),
+            "date": f"{current_date.day:02d}.{current_date.month:02d}.{current_date.year}",
+            "consumed": consumed,
+            "total_burned": total_burned,
+            "deficit": total_burned - consumed,
             "is_measurement_day": bool(analysis),
             "weight": weight_val,
             "bmi": bmi_val,
@@ -107,7 +172,9 @@ def get_deficit_history():
         if consumed > 0 or analysis or i < 3:
             history.append(day_data)
 
-    return jsonify(history)
+    with _DEFICIT_CACHE_LOCK:
+        _DEFICIT_CACHE[user.id] = (today, version, history)
+    return _conditional_json(history)
 
 # --- УВЕДОМЛЕНИЯ ---
 
@@ -117,14 +184,28 @@ def get_notifications():
     if not user:
         return jsonify({"ok": False, "error": "unauthorized"}), 401
 
-    # Берем последние 50 уведомлений
-    notifs = Notification.query.filter_by(user_id=user.id) \
-        .order_by(Notification.created_at.desc()) \
-        .limit(50).all()
+    # Страница из 50 уведомлений — только колонки, без ORM-объектов и to_dict().
+    # Keyset-пагинация: ?before=<id последнего на прошлой странице> вместо OFFSET
+    before = request.args.get('before', type=int)
+    stmt = select(Notification.id, Notification.title, Notification.body, Notification.type,
+                  Notification.is_read, Notification.data_json, Notification.created_at) \
+        .where(Notification.user_id == user.id)
+    if before:
+        stmt = stmt.where(Notification.id < before)
+    rows = db.session.execute(stmt.order_by(Notification.id.desc()).limit(50)).all()
 
     return jsonify({
         "ok": True,
-        "notifications": [n.to_dict() for n in notifs]
+        "next_before": rows[-1].id if len(rows) == 50 else None,
+        "notifications": [{
+            "id": r.id,
+            "title": r.title,
+            "body": r.body,
+            "type": r.type,
+            "is_read": r.is_read,
+            "data": json.loads(r.data_json) if r.data_json else {},
+            "created_at": r.created_at.isoformat()
+        } for r in rows]
     })
 
 
@@ -134,15 +215,53 @@ def mark_read(n_id):
     if not user:
         return jsonify({"ok": False}), 401
 
-    notif = Notification.query.filter_by(id=n_id, user_id=user.id).first()
-    if notif:
-        notif.is_read = True
-        db.session.commit()
+    # Один UPDATE вместо SELECT + UPDATE; повторный клик по прочитанному ничего не пишет
+    rows = Notification.query.filter_by(id=n_id, user_id=user.id, is_read=False) \
+        .update({Notification.is_read: True}, synchronize_session=False)
+    db.session.commit()
 
-    return jsonify({"ok": True})
+    return jsonify({"ok": True, "updated": rows})
+
+
+_MARK_READ_MAX_IDS = 500
+
+
+@user_bp.route('/api/notifications/read', methods=['POST'])
+def mark_read_batch():
+    """Пачкой: {"ids": [1, 2, 3]} или {"all": true} — один UPDATE вместо запроса на каждое уведомление"""
+    user = _current_user()
+    if not user:
+        return jsonify({"ok": False}), 401
+
+    payload = request.get_json(silent=True) or {}
+    mark_all = bool(payload.get("all"))
+    ids = payload.get("ids")
+    if not mark_all:
+        if not isinstance(ids, list) or not ids:
+            return jsonify({"ok": False, "error": "ids or all required"}), 400
+        if len(ids) > _MARK_READ_MAX_IDS:
+            return jsonify({"ok": False, "error": f"too many ids (max {_MARK_READ_MAX_IDS})"}), 400
+        # bool — подкласс int, поэтому сравниваем тип строго
+        if not all(type(i) is int and i > 0 for i in ids):
+            return jsonify({"ok": False, "error": "ids must be positive integers"}), 400
+
+    q = Notification.query.filter_by(user_id=user.id, is_read=False)
+    if not mark_all:
+        q = q.filter(Notification.id.in_(ids))
+    rows = q.update({Notification.is_read: True}, synchronize_session=False)
+    db.session.commit()
+
+    return jsonify({"ok": True, "updated": rows})
+
+
+def _limit_key():
+    """Лимит считаем на пользователя из сессии, для анонимов — на IP."""
+    uid = session.get("user_id")
+    return f"user:{uid}" if uid else get_remote_address()
 
 
 @user_bp.route('/api/notifications/test', methods=['POST'])
+@limiter.limit("5 per minute", key_func=_limit_key)
 def test_notif():
     """Тестовый роут для проверки (можно вызывать через Postman/Flutter)"""
     user = _current_user()
@@ -160,6 +279,10 @@ def test_notif():
 
 # --- УДАЛЕНИЕ АККАУНТА ---
 
+# Таблицы, которые на Postgres чистит ON DELETE CASCADE (см. _ensure_fk_cascade в app.py)
+_USER_OWNED_MODELS = (MealLog, Activity, Diet, BodyAnalysis, WeightLog, SquadScoreLog, MealReminderLog,
+                      Notification, UserSettings, DietPreference, Subscription, BodyVisualization)
+
 @user_bp.route('/api/me/delete', methods=['POST'])
 def delete_my_account():
     user = _current_user()
@@ -177,8 +300,16 @@ def delete_my_account():
         if getattr(user, "own_group", None):
             db.session.delete(user.own_group)
 
-        # Удаляем самого юзера. Все связанные таблицы (MealLog, Activity, BodyAnalysis и т.д.)
-        # будут удалены каскадно благодаря настройкам relationship в models.py
+        # Где каскада в БД нет (SQLite: FK не меняются и по умолчанию не проверяются) —
+        # чистим те же таблицы прямыми DELETE без синхронизации сессии, в той же транзакции
+        if db.engine.dialect.name != 'postgresql':
+            db.session.flush()
+            for model in _USER_OWNED_MODELS:
+                model.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+
+        # Удаляем самого юзера одним DELETE. Персональные таблицы (MealLog, Activity, BodyAnalysis,
+        # уведомления, настройки и т.д.) чистит сама БД по ON DELETE CASCADE —
+        # relationship с passive_deletes=True не вычитывает их в сессию
         db.session.delete(user)
         db.session.commit()
         session.clear()